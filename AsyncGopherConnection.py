@@ -0,0 +1,394 @@
+# Copyright (C) 2001 David Allen <mda@idatar.com>
+# Copyright (C) 2020 Tom4hawk
+#
+# Released under the terms of the GNU General Public License
+#
+# An asyncio version of GopherConnection.  Requests are built and responses
+# are parsed exactly as GopherConnection does it, only the socket work is
+# done with asyncio streams.  All of the coroutines run on one event loop
+# living in a background thread, so any number of fetches can be in flight
+# without a thread for each of them.
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#############################################################################
+import asyncio
+import threading
+import Connection
+import Sink
+import DNSCache
+import GopherConnection
+import SingleFlight
+import InfoCache
+import Options
+
+
+class EventLoopThread:
+    """Runs an asyncio event loop in a daemon thread.  Coroutines are handed
+    to it from any thread with submit()."""
+    def __init__(self):
+        self.loop   = asyncio.new_event_loop()
+        self.thread = threading.Thread(group=None,
+                                       target=self.run,
+                                       name="Event Loop Thread")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def getLoop(self):
+        return self.loop
+
+    def submit(self, coro):
+        """Schedules coro on the event loop and returns a
+        concurrent.futures.Future for its result.  Safe to call from any
+        thread."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+
+_event_loop      = None
+_event_loop_lock = threading.Lock()
+
+def getEventLoop():
+    """Returns the EventLoopThread shared by the whole program, starting it
+    the first time it's needed."""
+    global _event_loop
+
+    with _event_loop_lock:
+        if _event_loop is None:
+            _event_loop = EventLoopThread()
+    return _event_loop
+
+
+class AsyncGopherConnection(GopherConnection.GopherConnection):
+    """Same as GopherConnection, except getResource and getInfo are
+    coroutines.  Run them on the shared loop with
+    getEventLoop().submit(conn.getResource(resource))."""
+
+    async def getInfo(self, resource, msgBar=None, token=None):
+        info = InfoCache.memo.get(resource)
+        if info is not None:
+            return info
+
+        key = self.requestKey(resource, "!")
+        if key is None:
+            return await self.fetchInfo(resource, token=token)
+
+        def fetch(s=self, resource=resource, token=token):
+            return s.fetchInfo(resource, token=token)
+
+        try:
+            return await SingleFlight.inflight.doAsync(key, fetch, token,
+                                                       self.cancellable)
+        except Connection.ConnectionException as errstr:
+            raise GopherConnection.GopherConnectionException(errstr)
+
+    async def fetchInfo(self, resource, msgBar=None, token=None):
+        """Does the work for getInfo()"""
+        try:
+            sink = await self.requestToDataAsync(resource,
+                                                 self.infoRequest(resource),
+                                                 token=token)
+        except Connection.ConnectionException as errstr:
+            raise GopherConnection.GopherConnectionException(errstr)
+
+        return InfoCache.memo.set(resource, self.makeInfo(resource, sink))
+
+    async def getDirectoryInfo(self, resource, msgBar=None, token=None):
+        async def fetch(s=self, resource=resource, token=token):
+            try:
+                sink = await s.requestToDataAsync(
+                    resource, s.directoryInfoRequest(resource), token=token)
+            except Connection.ConnectionException as errstr:
+                raise GopherConnection.GopherConnectionException(errstr)
+            return s.makeDirectoryInfo(sink)
+
+        key = self.requestKey(resource, "$")
+        if key is None:
+            return await fetch()
+
+        try:
+            return await SingleFlight.inflight.doAsync(key, fetch, token,
+                                                       self.cancellable)
+        except Connection.ConnectionException as errstr:
+            raise GopherConnection.GopherConnectionException(errstr)
+
+    async def prefetchInfo(self, resources, callback=None, token=None,
+                           limit=None, directory=None):
+        """Fetches the information blocks of resources that don't have one
+        yet and attaches them.  If directory (the menu resources came from)
+        is given, all blocks are first asked for with one request; whatever
+        that doesn't turn up is fetched item by item, at most limit at a
+        time.  callback(resource, info) is called on the loop thread as each
+        block arrives.  Failures are skipped.  Returns the number of blocks
+        fetched."""
+        if limit is None:
+            limit = Options.program_options.getIntOption('prefetch_limit', 4)
+        semaphore = asyncio.Semaphore(max(1, limit))
+        wanted    = [r for r in resources if r.getInfo() is None]
+        count     = 0
+
+        def attach(resource, info, s=self):
+            resource.setInfo(InfoCache.memo.set(resource, info))
+            if callback is not None:
+                callback(resource, info)
+            return info
+
+        if directory is not None and len(wanted) > 1 and \
+           not directory.getDataBlock():
+            try:
+                infos = await self.getDirectoryInfo(directory, token=token)
+            except GopherConnection.GopherConnectionException as errstr:
+                if self.verbose:
+                    print("No directory info for %s: %s" %
+                          (directory.toURL(), errstr))
+                infos = {}
+
+            remaining = []
+            for r in wanted:
+                info = infos.get(self.itemKey(r))
+                if info is None:
+                    remaining.append(r)
+                else:
+                    attach(r, info)
+                    count = count + 1
+            wanted = remaining
+
+        async def fetch(resource, s=self):
+            async with semaphore:
+                if token is not None and token.isCancelled():
+                    return None
+                try:
+                    info = await s.getInfo(resource, token=token)
+                except GopherConnection.GopherConnectionException as errstr:
+                    if s.verbose:
+                        print("Couldn't prefetch info for %s: %s" %
+                              (resource.toURL(), errstr))
+                    return None
+            return attach(resource, info)
+
+        results = await asyncio.gather(*[fetch(r) for r in wanted])
+        return count + len([info for info in results if info is not None])
+
+    async def getResource(self, resource, msgBar=None, token=None):
+        if self.needsAskForm(resource):
+            # Every form gets its own answers, so never share these.
+            return await self.fetchResource(resource, token=token)
+
+        key = self.requestKey(resource, "+")
+        if key is None:
+            return await self.fetchResource(resource, token=token)
+
+        def fetch(s=self, resource=resource, token=token):
+            return s.fetchResource(resource, token=token)
+
+        try:
+            return await SingleFlight.inflight.doAsync(key, fetch, token,
+                                                       self.cancellable)
+        except Connection.ConnectionException as estr:
+            return self.makeErrorResponse(resource, estr)
+
+    async def fetchResource(self, resource, msgBar=None, token=None):
+        """Does the work for getResource()"""
+        self.forgetResponse()
+
+        if self.needsAskForm(resource):
+            info = resource.getInfo()
+
+            if info is None:
+                try:
+                    info = resource.setInfo(await self.getInfo(resource,
+                                                               token=token))
+                except GopherConnection.GopherConnectionException as estr:
+                    return self.makeErrorResponse(resource, estr)
+            return self.makeAskForm(resource, info)
+
+        [request, grokLine] = self.resourceRequest(resource)
+
+        try:
+            self.response = await self.requestToDataAsync(
+                resource, request, grokLine, self.makeSink(resource), token)
+        except Connection.ConnectionException as estr:
+            return self.makeErrorResponse(resource, estr)
+
+        return self.makeResponse(resource, self.response)
+
+    async def lookup(self, host):
+        """Returns the IP addresses of host, using the program wide cache.
+        Lookups run on the cache's own threads, not on the loop."""
+        dns = Options.program_options.getDNSCache()
+
+        try:
+            return dns.get(host)
+        except KeyError:
+            pass
+        except DNSCache.DNSCacheException as err:
+            raise Connection.ConnectionException("Cannot lookup\n%s:\n%s" %
+                                                 (host, err))
+
+        try:
+            # shield() keeps our cancellation from cancelling a lookup
+            # other requests may be waiting on.
+            addresses = await asyncio.shield(asyncio.wrap_future(
+                dns.submit(host)))
+        except DNSCache.DNSCacheException as err:
+            raise Connection.ConnectionException("Cannot lookup\n%s:\n%s" %
+                                                 (host, err))
+        return addresses
+
+    async def raceAsync(self, addresses, port):
+        """Coroutine version of Connection.race().  Returns [reader, writer]
+        for whichever of addresses accepts a connection to port first.
+        Throws the last OSError if none of them do."""
+        remaining = list(addresses)
+        attempts  = set()
+        error     = None
+
+        try:
+            while remaining or attempts:
+                wait = None
+                if remaining:
+                    attempts.add(asyncio.ensure_future(
+                        asyncio.open_connection(remaining.pop(0), port)))
+                    if remaining:
+                        wait = self.ATTEMPT_DELAY
+
+                # Wait for an attempt to finish, or until it's time to start
+                # the next one.  A failed attempt starts the next one early.
+                [done, attempts] = await asyncio.wait(
+                    attempts, timeout=wait,
+                    return_when=asyncio.FIRST_COMPLETED)
+
+                winner = None
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                    elif winner is None:
+                        winner = task.result()
+                    else:
+                        task.result()[1].close()   # Lost a photo finish.
+
+                if winner is not None:
+                    return winner
+        finally:
+            for task in attempts:
+                task.cancel()
+
+        if error is None:
+            error = OSError("No addresses to connect to")
+        raise error
+
+    async def requestToDataAsync(self, resource, request, grokLine=None,
+                                 sink=None, token=None):
+        """Coroutine version of Connection.requestToData.  Sends request to
+        the host/port stored in resource, and returns a sink holding the
+        data returned by the server.  May throw ConnectionException, which
+        it also does if token is cancelled or the server times out."""
+        if sink is None:
+            sink = Sink.MemorySink()
+
+        return await self.cancellable(
+            self.talkAsync(resource, request, grokLine, sink), token)
+
+    async def cancellable(self, aw, token=None):
+        """Awaits aw and returns its result.  If token is cancelled first,
+        the wait is cancelled and ConnectionException is thrown."""
+        if token is None:
+            return await aw
+
+        # Cancelling the token cancels the task doing the work.  The token
+        # may be cancelled from any thread, so go through the loop.
+        loop = asyncio.get_running_loop()
+        task = asyncio.current_task()
+
+        def cancel(loop=loop, task=task):
+            loop.call_soon_threadsafe(task.cancel)
+
+        remove = token.addCallback(cancel)
+
+        try:
+            return await aw
+        except asyncio.CancelledError:
+            if not token.isCancelled():
+                raise        # Somebody else cancelled us.  Pass it on.
+            raise Connection.ConnectionException("Connection stopped")
+        finally:
+            remove()
+
+    async def talkAsync(self, resource, request, grokLine, sink):
+        """Does the actual work for requestToDataAsync()"""
+        addresses = await self.lookup(resource.getHost())
+        where     = "%s:%s" % (resource.getHost(), resource.getPort())
+
+        try:
+            [reader, writer] = await asyncio.wait_for(
+                self.raceAsync(addresses, int(resource.getPort())),
+                self.getTimeout('connect_timeout'))
+        except asyncio.TimeoutError:
+            raise Connection.ConnectionException("Timed out connecting to\n%s"
+                                                 % where)
+        except (OSError, ValueError) as err:
+            raise Connection.ConnectionException(
+                "Cannot connect to\n%s:\n%s" % (where, err))
+
+        Options.program_options.getDNSCache().setPreferred(
+            resource.getHost(), writer.get_extra_info('socket').family)
+
+        try:
+            writer.write(request.encode())
+            await writer.drain()
+            self.sent(len(request))
+
+            # The server gets first_byte_timeout to start answering, and
+            # idle_timeout between chunks after that.
+            timeout = self.getTimeout('first_byte_timeout')
+
+            if grokLine:
+                # The stream is buffered, so reading the status line this
+                # way doesn't cost a read per byte.
+                line = await asyncio.wait_for(reader.readline(), timeout)
+                timeout = self.getTimeout('idle_timeout')
+                self.received(len(line))
+                status = line.decode(encoding="utf-8", errors="ignore").strip()
+
+                if status[0:1] == '+' or status[0:1] == '-':
+                    try:
+                        if status[0] == '+':
+                            resource.setLen(int(status[1:]))
+                    except ValueError:
+                        print("*** Couldn't read bytecount: skipping.")
+                else:
+                    sink.write(line)  # Not a Gopher+ server.  Line is data.
+
+            while not sink.isComplete():
+                chunk = await asyncio.wait_for(reader.read(self.CHUNKSIZE),
+                                               timeout)
+                timeout = self.getTimeout('idle_timeout')
+                if not chunk:
+                    break
+                self.received(len(chunk))
+                sink.write(chunk)
+        except asyncio.TimeoutError:
+            raise Connection.ConnectionException("Timed out talking to\n%s" %
+                                                 where)
+        except OSError as err:
+            raise Connection.ConnectionException(
+                "Error reading from\n%s:\n%s" % (where, err))
+        finally:
+            sink.close()
+            writer.close()
+
+        return sink
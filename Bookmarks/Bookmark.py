@@ -23,6 +23,8 @@ import GopherResource
 
 
 class Bookmark(GopherResource.GopherResource):
+    __slots__ = ()     # Nothing more than a GopherResource holds
+
     def __init__(self, res=None):
         GopherResource.GopherResource.__init__(self)
 
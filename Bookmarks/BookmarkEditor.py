@@ -188,6 +188,11 @@ class BookmarkEditor(Toplevel):
         prefs_dir = Options.program_options.getOption('prefs_directory')
         filename = prefs_dir + os.sep + "bookmarks"
         factory = BookmarkFactory()
+
+        # The edited bookmarks are the ones that stay in the cache now, not
+        # the ones the program started with.
+        if bmarks is not None:
+            Options.program_options.cache.setPinned(bmarks.getBookmarks())
         
         try:
             factory.writeXML(filename, bmarks)
@@ -72,6 +72,22 @@ class BookmarkMenu(List.List):
             raise Exception("Cannot add a non-Bookmark/Menu as submenu")
         return self.insert(BookmarkMenuNode(menu))
 
+    def getBookmarks(self):
+        """Returns a list of all of the Bookmarks in this menu and in its
+        submenus, in order."""
+        bookmarks = []
+
+        def fn(item, found=bookmarks):
+            data = item.getData()
+            if data.__class__ == BookmarkMenu:
+                found.extend(data.getBookmarks())
+            else:
+                found.append(data)
+            return data.getName()
+
+        self.traverse(fn)
+        return bookmarks
+
     def toXML(self):
         """Returns an XML representation of this object.  This is called
         recursively"""
@@ -20,11 +20,23 @@
 #  Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
 ############################################################################
 import os
+import time
+import gzip
+import lzma
+import zlib
+import shutil
 import utils
 import string
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from gopher import *
 from tkinter import *
 import GopherResponse
+import Sniffer
+import ResourceInformation
+import CacheIndex
+import ResponseCache
+import GopherObject
 import Pmw
 import Options
 
@@ -36,9 +48,50 @@ class CacheException(Exception):
 
 class Cache:
     verbose = None
+    INDEX_FILENAME = "index.db"     # In the cache directory
+    EVICT_TO       = 0.9            # Evict down to this much of the budget
+    EVICT_BATCH    = 256            # Files looked at per trip to the index
+
+    # What cached copies can be compressed with: the header FORG puts in
+    # front of files it compressed, how to compress bytes, and how to open
+    # a file that decompresses as it's read.  See the cache_compression
+    # option.  The headers are FORG's own so that a .gz or .xz a server
+    # sends isn't mistaken for one of ours; those are cached as they come.
+    COMPRESSORS = {"zlib": [b"FORGZ01\n",
+                            lambda data: gzip.compress(data, 6, mtime=0),
+                            gzip.open],
+                   "lzma": [b"FORGXZ1\n", lzma.compress, lzma.open]}
+    HEADER_SIZE = 8
+
+    # Menus are read back the most, so they always get the compressor that's
+    # quickest to undo.
+    MENU_COMPRESSOR = "zlib"
+
+    # What's thrown reading a cached file that has been damaged
+    DAMAGED = (EOFError, zlib.error, lzma.LZMAError, gzip.BadGzipFile,
+               UnicodeDecodeError)
     
     def __init__(self, *args):
         self._d = None
+        self.index     = None
+        self.indexLock = threading.Lock()
+        self.pins      = []         # Paths that are never evicted
+
+        # Eviction runs on its own thread, at most one pass at a time.
+        self.evictLock    = threading.Lock()
+        self.evictPool    = None
+        self.evictPending = None
+        self.evictedFiles = 0       # Since the program started
+        self.evictedBytes = 0
+
+        # [files, bytes in, bytes out, CPU seconds] compressed, and [files,
+        # CPU seconds] decompressed, since the program started.
+        self.statsLock    = threading.Lock()
+        self.compressed   = [0, 0, 0, 0.0]
+        self.decompressed = [0, 0.0]
+
+        # Parsed responses, so the files don't need reading over and over.
+        self.responses = ResponseCache.ResponseCache()
 
     def getCacheDirectory(self):
         try:
@@ -54,10 +107,202 @@ class Cache:
         except:
             return os.path.abspath("cache%scache" % os.sep)
 
+    def getSpoolDirectory(self):
+        """Returns the directory where large downloads are written while
+        they arrive, before they are moved into the cache."""
+        return os.path.join(self.getCacheDirectory(), ".spool")
+
+    def emptySpool(self):
+        """Deletes downloads left behind in the spool directory.  These are
+        only kept around while the program runs."""
+        spool = self.getSpoolDirectory()
+
+        if utils.dir_exists(spool):
+            utils.recursive_delete(spool)
+        return None
+
+    def getIndex(self):
+        """Returns the CacheIndex of the cache directory.  It's opened the
+        first time it's needed, and if it had to be created it's filled in
+        from the files already in the cache."""
+        filename = os.path.join(self.getCacheDirectory(), self.INDEX_FILENAME)
+
+        with self.indexLock:
+            if self.index is None or self.index.getFilename() != filename:
+                # Not opened yet, or the cache directory option changed.
+                if self.index is not None:
+                    self.index.close()
+                self.index = CacheIndex.CacheIndex(filename)
+
+                if self.index.isNew():
+                    self.rebuildIndex(self.index)
+                if self.pins:
+                    self.index.setPins(self.pins)
+
+                # The budget may be smaller than it was last time.
+                self.evictSoon()
+            return self.index
+
+    def rebuildIndex(self, index=None):
+        """Throws away what the index says and fills it in again from the
+        files in the cache.  Returns the number of files found."""
+        if index is None:
+            index = self.getIndex()
+
+        pref     = self.getCachePrefix()
+        infoname = self.getInfoFilename(GopherObject.DIRECTORY_FILENAME)
+        entries  = []
+
+        for [dirpath, dirnames, filenames] in os.walk(pref):
+            if dirpath == pref:
+                # Only hosts are up here; the rest is the index itself, the
+                # spool, and whatever else lives in the cache directory.
+                dirnames[:] = [x for x in dirnames if not x.startswith(".")]
+                continue
+
+            for filename in filenames:
+                if filename == infoname:
+                    continue
+
+                path = os.path.join(dirpath, filename)
+                try:
+                    info = os.stat(path)
+                except OSError:
+                    continue
+
+                relpath = os.path.relpath(path, pref)
+                entries.append([relpath,
+                                GopherObject.cacheFilenameToKey(relpath),
+                                info.st_size, info.st_mtime])
+
+        index.clear()
+        index.addMany(entries)
+
+        print("Indexed %d files in %s" % (len(entries), pref))
+        return len(entries)
+
+    def indexFile(self, resource, filename):
+        """Records in the index that resource was just cached as filename"""
+        try:
+            size = os.path.getsize(filename)
+        except OSError:
+            return None
+
+        self.getIndex().add(resource.toCacheFilename(), resource.getKey(),
+                            size)
+        return None
+
+    def setPinned(self, resources):
+        """Makes resources, and only those, safe from eviction.  They
+        needn't be cached yet; if they ever are, they stay."""
+        self.pins = [r.toCacheFilename() for r in resources]
+        self.getIndex().setPins(self.pins)
+        return None
+
+    def getBudget(self):
+        """Returns [files, bytes], the most the cache may hold before the
+        least recently used files are evicted.  0 means no limit."""
+        opts = Options.program_options
+        return [opts.getIntOption('cache_max_files'),
+                opts.getIntOption('cache_max_bytes')]
+
+    def isOverBudget(self, totals, budget, slack=1.0):
+        for [used, allowed] in zip(totals, budget):
+            if allowed > 0 and used > allowed * slack:
+                return 1
+        return None
+
+    def evictSoon(self):
+        """Has the eviction thread check the budget, unless it's about to
+        anyway.  Returns right away."""
+        if self.getBudget() == [0, 0]:
+            return None
+
+        with self.evictLock:
+            if self.evictPending:
+                return None
+            self.evictPending = 1
+
+            if self.evictPool is None:
+                self.evictPool = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="CacheEviction")
+            self.evictPool.submit(self.evict)
+        return None
+
+    def evict(self):
+        """Deletes the least recently used files that aren't pinned until
+        the cache is back under EVICT_TO of its budget, if it was over.
+        Returns the number of files deleted."""
+        with self.evictLock:
+            self.evictPending = None
+
+        index  = self.getIndex()
+        budget = self.getBudget()
+        totals = index.getTotals()
+        count  = 0
+
+        if not self.isOverBudget(totals, budget):
+            return 0
+
+        pref     = self.getCachePrefix()
+        [files, size] = totals
+
+        while self.isOverBudget([files, size], budget, self.EVICT_TO):
+            coldest = index.getColdest(self.EVICT_BATCH)
+            if not coldest:
+                break     # Everything left is pinned.
+
+            paths = []
+            for [path, length] in coldest:
+                filename = os.path.join(pref, path)
+                try:
+                    os.unlink(filename)
+                    count = count + 1
+                    with self.evictLock:
+                        self.evictedFiles = self.evictedFiles + 1
+                        self.evictedBytes = self.evictedBytes + length
+                except OSError:
+                    pass      # Already gone, or can't go.  Forget it anyway.
+
+                if filename.endswith(GopherObject.DIRECTORY_FILENAME):
+                    try:
+                        os.unlink(self.getInfoFilename(filename))
+                    except OSError:
+                        pass
+
+                paths.append(path)
+                files = files - 1
+                size  = size - length
+                if not self.isOverBudget([files, size], budget,
+                                         self.EVICT_TO):
+                    break
+
+            index.forgetMany(paths)
+
+        if count:
+            print("Evicted %d files from the cache" % count)
+        return count
+
+    def getResponseCache(self):
+        """Returns the ResponseCache sitting in front of the files, with
+        its budget brought up to date with the options.  A budget of 0
+        turns it off."""
+        budget = Options.program_options.getIntOption('response_cache_bytes')
+
+        if budget != self.responses.budget:
+            self.responses.setBudget(budget)
+        return self.responses
+
+    def getEvictionStats(self):
+        """Returns [files, bytes] evicted since the program started"""
+        with self.evictLock:
+            return [self.evictedFiles, self.evictedBytes]
+
     def getCacheStats(self):
         cdir = self.getCacheDirectory()
+        index = self.getIndex()
         
-        [filecount, totalBytes, dircount] = utils.summarize_directory(cdir)
+        [filecount, totalBytes, hostcount] = index.summarize()
 
         kbcount = float(totalBytes)/float(1024)
         mbcount = kbcount/float(1024)
@@ -66,10 +311,49 @@ class Cache:
         mbcount = "%0.2fMB" % mbcount
 
         datasize = "There is %s (%s) of data" % (kbcount, mbcount)
-        fdcount  = "in %s files (%s directories total)" % (filecount, dircount)
+        fdcount  = "in %s files from %s hosts" % (filecount, hostcount)
         closer   = "underneath %s" % cdir
 
-        return "%s\n%s\n%s" % (datasize, fdcount, closer)
+        [maxfiles, maxbytes] = self.getBudget()
+        [evfiles, evbytes]   = self.getEvictionStats()
+
+        if maxbytes > 0:
+            maxbytes = "%0.2fMB" % (float(maxbytes)/float(1024 * 1024))
+        else:
+            maxbytes = "no size limit"
+        if maxfiles > 0:
+            maxfiles = "%s files" % maxfiles
+        else:
+            maxfiles = "no file limit"
+
+        budget   = "Budget: %s, %s (%s pinned)" % (maxbytes, maxfiles,
+                                                   index.countPins())
+        evicted  = "%s files (%0.2fMB) evicted this session" % (
+            evfiles, float(evbytes)/float(1024 * 1024))
+
+        [rcount, rbytes, hits, misses] = self.getResponseCache().getStats()
+        inmemory = "%s responses (%0.2fMB) in memory, %s hits, %s misses" % (
+            rcount, float(rbytes)/float(1024 * 1024), hits, misses)
+
+        with self.statsLock:
+            [cfiles, cin, cout, ccpu] = self.compressed
+            [dfiles, dcpu]            = self.decompressed
+
+        method = Options.program_options.getOption('cache_compression')
+        if method not in self.COMPRESSORS:
+            method = "off"
+
+        packed = "Compression %s: %s files this session" % (method, cfiles)
+        if cout > 0:
+            packed = packed + ", %0.2fMB to %0.2fMB (%0.1fx)" % (
+                float(cin)/float(1024 * 1024), float(cout)/float(1024 * 1024),
+                float(cin)/float(cout))
+        cputime = "%0.0f ms CPU compressing, %0.0f ms decompressing %s files" % (
+            ccpu * 1000, dcpu * 1000, dfiles)
+
+        return "%s\n%s\n%s\n%s\n%s\n%s\n%s\n%s" % (datasize, fdcount, closer,
+                                                   budget, evicted, inmemory,
+                                                   packed, cputime)
 
     def emptyCache(self, parentTk):
         pref = self.getCachePrefix()
@@ -120,6 +404,7 @@ class Cache:
             raise CacheException("Cache prefix %s doesn't exist." % pref)
                         
         cache_directories = os.listdir(pref)
+        index = self.getIndex()
 
         # I've been told that there's a shell utility module that does this
         # probably safer and better, but I'm not sure where it is, or whether
@@ -131,54 +416,68 @@ class Cache:
             if os.path.isdir(item):
                 print("Recursively deleting \"%s\"" % item)
                 utils.recursive_delete(item)
+            elif item.startswith(index.getFilename()):
+                pass
             else:
                 print("Eh?  \"%s\" isn't a directory.  That's odd..." % item)
 
+        index.clear()
+        self.responses.clear()
+
     def isInCache(self, resource):
         """Takes a resource, and returns true if the resource seems to have
-        an available cache file associated with it, and None otherwise."""
-
-        pref     = self.getCachePrefix()
-        filename = resource.toCacheFilename()
-        
-        if pref[len(pref)-1] != os.sep and filename[0] != os.sep:
-            # When joining together, separate paths with os.sep
-            pref = "%s%s" % (pref, os.sep)
+        an available cache file associated with it, and None otherwise.
+        What comes back is [filename, size].  This only asks the index, so
+        it's cheap enough to do for every item in a directory."""
+        file  = resource.toCacheFilename()
+        entry = self.getIndex().get(file)
 
-        # Now join together, and they will be properly joined.
-        filename = pref + filename
-
-        try:
-            info = os.stat(os.path.abspath(filename))
-            return [os.path.abspath(filename), info[6]]
-        except OSError:
+        if entry is None:
             return None
-        return None
+
+        filename = os.path.join(self.getCachePrefix(), file)
+        return [os.path.abspath(filename), entry[0]]
         
     def uncache(self, resource):
         """Takes a resource, and returns either None if the given resource
         is not cached on disk, or it returns a GopherResponse corresponding
         to what would have been gotten if it had been fetched from the
-        server."""
+        server.  Responses still in memory come back without going near
+        the disk."""
 
         pref = self.getCachePrefix()
         file = resource.toCacheFilename()
+        memo = self.getResponseCache()
+
+        resp = memo.get(resource)
+        if resp is not None:
+            self.getIndex().touch(file)
+            return resp
 
         if pref[len(pref)-1] != os.sep and file[0] != os.sep:
             # When joining together, separate paths with os.sep
             pref = "%s%s" % (pref, os.sep)
             
         filename = pref + file
-        
+        index    = self.getIndex()
+
+        if index.get(file) is None:
+            # Not cached, as far as the index knows.
+            return None
+
         try:
             # See if the file exists...
             tuple = os.stat(filename)
             if self.verbose:
                 print("File %s of size %d exists." % (filename, tuple[6]))
         except OSError:
-            # The file doesn't exist, we can't uncache it.
+            # The file doesn't exist, we can't uncache it.  Somebody
+            # deleted it behind our back, so the index is wrong about it.
+            index.forget(file)
             return None
 
+        index.touch(file)
+
         print("===> Uncaching \"%s\"" % filename)
         resp = GopherResponse.GopherResponse()
         resp.setType(resource.getTypeCode())
@@ -188,24 +487,72 @@ class Cache:
         resp.setName(resource.getName())
         
         try:
-            fp = open(filename, "r")
+            if resource.isBinaryType():
+                # Binary data is handed back as bytes, exactly as it was
+                # received.  It is never a directory, so don't parse it, and
+                # don't read it either until somebody asks for it.
+                resp.setDataFile(filename)
+                return resp
+
+            if file.endswith(GopherObject.DIRECTORY_FILENAME):
+                try:
+                    loaded = self.readMenu(resp, filename)
+                except GopherResponse.GopherResponseException as errstr:
+                    # Written by some other version, or damaged.  Either way
+                    # it's no good, so get it from the server again.
+                    print("Can't load %s: %s" % (filename, errstr))
+                    index.forget(file)
+                    return None
+
+                if loaded:
+                    self.uncacheInfo(resp, filename)
+                    return memo.set(resource, resp)
+
+                # Otherwise it's in the text format directories used to be
+                # cached in, which is read like any other text below.
+
+            if self.getCompression(filename) is None:
+                # Servers get type codes wrong, so check what's really in
+                # there before reading the whole thing in as text.  Only the
+                # start of the file is looked at.  Compressed files are
+                # always text; nothing else gets compressed.
+                resp.setDataFile(filename)
+                if resp.sniff()[0] in [Sniffer.IMAGE, Sniffer.BINARY]:
+                    return resp
 
             # Consider reworking this somehow.  Slurp the entire file into
             # buffer.
-            buffer = fp.read()
-            fp.close()
+            buffer = self.readCacheFile(filename, "r")
 
             try:
                 resp.parseResponse(buffer)
                 resp.setData(None)
                 # print "Loaded cache is a directory entry."
+                self.uncacheInfo(resp, filename)
             except:
                 # print "Loaded cache is not a directory."
                 resp.setData(buffer)
+
+            if resp.getData() is None and \
+               file.endswith(GopherObject.DIRECTORY_FILENAME):
+                # Cached before directories were saved ready to load.  Save
+                # it that way now so it doesn't need parsing next time.
+                try:
+                    self.writeMenu(resp, filename,
+                                   self.chooseCompression(resource, resp,
+                                                          filename))
+                    self.indexFile(resource, filename)
+                except IOError:
+                    pass
                 
             # Got it!  Loaded from cache anyway...
             # print "UNCACHE found data for use."
-            return resp       
+            return memo.set(resource, resp)
+        except self.DAMAGED as errstr:
+            # Damaged somehow.  Get it from the server again.
+            print("Can't read %s: %s" % (filename, errstr))
+            index.forget(file)
+            return None
         except IOError as errstr:
             raise CacheException("Couldn't read data on\n%s:\n%s" % (filename,
                                                                       errstr))
@@ -226,6 +573,13 @@ class Cache:
         
         basedir      = self.getCachePrefix()
         basefilename = resource.toCacheFilename()
+        memo         = self.getResponseCache()
+
+        if memo.isRemembered(resource, resp) and \
+           self.getIndex().get(basefilename) is not None:
+            # This came out of the cache, or already went into it.  The file
+            # has it already.
+            return os.path.abspath(os.path.join(basedir, basefilename))
 
         # Problem - basedir is our base directory, but basefilename contains
         # trailing filename info that shouldn't be part of the directories
@@ -249,28 +603,42 @@ class Cache:
 
         # print "Cache: caching data to \"%s\"" % filename
         
+        datafile = resp.getDataFile()
+
+        if datafile is not None:
+            # The data is already in a file.  If it's a download that was
+            # spilled to disk, move it into place rather than copying it.
+            try:
+                if os.path.abspath(datafile) == os.path.abspath(filename):
+                    pass
+                elif os.path.dirname(os.path.abspath(datafile)) == \
+                     self.getSpoolDirectory():
+                    os.replace(datafile, filename)
+                    resp.setDataFile(filename)
+                else:
+                    shutil.copyfile(datafile, filename)
+            except (IOError, OSError) as errstr:
+                raise CacheException("Couldn't write to\n%s:\n%s" % (filename, errstr))
+            self.indexFile(resource, filename)
+            self.evictSoon()
+            memo.forget(resource)
+            return os.path.abspath(filename)
+
         try:
-            fp = open(filename, "w")
+            method = self.chooseCompression(resource, resp, filename)
 
             if resp.getData() is None:    # This is a directory entry.
-                response_lines = resp.getResponses()
-                # Each response line is a GopherResource
-                # write them as if it was a file served by the gopher server.
-                # that way it can be easily reparsed when loaded from the
-                # cache.
-                for response_line in response_lines:
-                    fp.write(response_line.toProtocolString())
-
-                # write the string terminator.  This isn't really needed
-                # since it isn't data, but it helps fool our other objects
-                # into thinking that it's dealing with data off of a socket
-                # instead of data from a file.  So do it.
-                fp.write("\r\n.\r\n") 
+                self.writeMenu(resp, filename, method)
             else:
-                fp.write(resp.getData())
+                # Binary data is written back out byte for byte.
+                self.writeCacheFile(filename, resp.getData(), method)
 
-            fp.flush()
-            fp.close()
+            self.indexFile(resource, filename)
+            self.evictSoon()
+            memo.set(resource, resp)
+
+            if resp.getData() is None:
+                self.writeInfo(resp, filename)
         except IOError as errstr:
             # Some error writing data to the file.  Bummer.
             raise CacheException("Couldn't write to\n%s:\n%s" % (filename, errstr))
@@ -279,3 +647,212 @@ class Cache:
         return os.path.abspath(filename)
         
 
+    def readMenu(self, resp, filename):
+        """Loads the directory saved in filename by writeMenu() into resp.
+        Returns None if filename isn't in that format, like directories
+        cached by older versions.  Throws GopherResponseException if it is
+        but can't be loaded, and IOError."""
+        return resp.setBinary(self.readCacheFile(filename, "rb"))
+
+    def writeMenu(self, resp, filename, method=None):
+        """Writes resp, a directory response, to filename in the form
+        readMenu() loads, compressed with method if it isn't None.  The rows
+        are written out already cut up, so that loading them from the cache
+        doesn't mean parsing them all over again.  Throws IOError."""
+        return self.writeCacheFile(filename, resp.toBinary(), method)
+
+    def chooseCompression(self, resource, resp, filename):
+        """Returns how the copy of resp, the response for resource, cached
+        as filename should be compressed: one of the keys of COMPRESSORS,
+        or None if it shouldn't be.  Only text and menus ever are."""
+        opts   = Options.program_options
+        method = opts.getOption('cache_compression')
+
+        if method not in self.COMPRESSORS:
+            return None                     # Turned off
+        elif resource.isBinaryType():
+            return None                     # Mostly compressed already
+        elif resp.getData() is None:
+            return self.MENU_COMPRESSOR
+        elif not isinstance(resp.getData(), str):
+            return None                     # Binary, whatever the type says
+        elif opts.getAssociations().getAssociation(filename) is not None:
+            return None                     # Other programs get handed this
+        return method
+
+    def getCompression(self, filename):
+        """Returns what filename was compressed with, one of the keys of
+        COMPRESSORS, or None if it wasn't.  Throws IOError."""
+        fp = open(filename, "rb")
+        start = fp.read(self.HEADER_SIZE)
+        fp.close()
+        return self.getMethod(start)
+
+    def getMethod(self, header):
+        """Returns the key of COMPRESSORS whose header is header, or None"""
+        for [method, [magic, compress, opener]] in self.COMPRESSORS.items():
+            if header == magic:
+                return method
+        return None
+
+    def readCacheFile(self, filename, mode="rb"):
+        """Returns what's in filename, as bytes if mode is "rb" and as a
+        string if it's "r".  Compressed files are decompressed a piece at
+        a time as they're read.  Throws IOError, or one of DAMAGED."""
+        raw    = open(filename, "rb")
+        method = self.getMethod(raw.read(self.HEADER_SIZE))
+
+        if method is None:
+            raw.close()
+            fp = open(filename, mode)
+            data = fp.read()
+            fp.close()
+            return data
+
+        # The compressed stream starts right after the header.
+        opener = self.COMPRESSORS[method][2]
+        start  = time.thread_time()
+
+        try:
+            if mode == "r":
+                fp = opener(raw, "rt", encoding="utf-8",
+                            errors="surrogatepass")
+            else:
+                fp = opener(raw, "rb")
+            data = fp.read()
+            fp.close()
+        finally:
+            raw.close()
+
+        with self.statsLock:
+            self.decompressed[0] = self.decompressed[0] + 1
+            self.decompressed[1] = self.decompressed[1] + \
+                                   time.thread_time() - start
+        return data
+
+    def writeCacheFile(self, filename, data, method=None):
+        """Writes data, a string or bytes, to filename, compressed with
+        method if it isn't None.  Throws IOError."""
+        if method is not None:
+            start = time.thread_time()
+
+            if isinstance(data, str):
+                data = data.encode("utf-8", "surrogatepass")
+            packed = self.COMPRESSORS[method][1](data)
+
+            with self.statsLock:
+                [files, bytesin, bytesout, cpu] = self.compressed
+                self.compressed = [files + 1, bytesin + len(data),
+                                   bytesout + len(packed),
+                                   cpu + time.thread_time() - start]
+            data = self.COMPRESSORS[method][0] + packed
+
+        if isinstance(data, str):
+            fp = open(filename, "w")
+        else:
+            fp = open(filename, "wb")
+
+        fp.write(data)
+        fp.flush()
+        fp.close()
+        return None
+
+    def getInfoFilename(self, filename):
+        """Returns the name of the file holding the information blocks of
+        the items in the directory cached as filename."""
+        if filename.endswith(".idx"):
+            return filename[0:-len(".idx")] + ".info"
+        return filename + ".info"
+
+    def cacheInfo(self, resp, resource):
+        """Saves the information blocks of the items in resp, the directory
+        response for resource, next to its cached copy.  Does nothing if
+        the directory isn't cached.  Returns the filename written to, or
+        None."""
+        incache = self.isInCache(resource)
+
+        if incache is None:
+            return None
+        return self.writeInfo(resp, incache[0])
+
+    def writeInfo(self, resp, filename):
+        """Writes the information blocks of the items in resp to the info
+        file that goes with filename.  Each block is stored with the time
+        it was fetched.  Returns the info filename, or None if there was
+        nothing to write.  Throws IOError."""
+        store = resp.getResponses()
+        infos = [[r.toURL(), r.getInfo()] for r in store.getMade()]
+
+        # Only resources that were made can have had blocks fetched.  Blocks
+        # loaded from the cache for rows that haven't been made yet are
+        # still good, and are written back out too.
+        infos.extend(store.getInfos().items())
+        records = []
+
+        for [url, info] in infos:
+            if info is None or info.getData() is None:
+                continue
+
+            data = info.getData()
+            records.append("=%d %d %s\n%s\n" % (int(info.getFetchTime()),
+                                                len(data), url, data))
+
+        if not records:
+            return None
+
+        infofile = self.getInfoFilename(filename)
+        fp = open(infofile, "w")
+        fp.write("# Gopher+ information blocks cached by the FORG.\n")
+        fp.write("".join(records))
+        fp.flush()
+        fp.close()
+        return infofile
+
+    def uncacheInfo(self, resp, filename):
+        """Reattaches information blocks saved by writeInfo() to the items
+        of resp, the directory uncached from filename.  Blocks older than
+        the info_ttl option are ignored.  They're attached as each item is
+        made into a resource, so loading a big directory doesn't make them
+        all; see MenuStore.setInfos().  Returns the number of blocks."""
+        infofile = self.getInfoFilename(filename)
+
+        try:
+            fp = open(infofile, "r")
+            data = fp.read()
+            fp.close()
+        except IOError:
+            return 0
+
+        ttl    = Options.program_options.getIntOption('info_ttl')
+        oldest = time.time() - ttl
+        infos  = {}
+        index  = data.find("\n=")
+
+        # Each record is "=fetchtime length URL\n" followed by length
+        # characters of blocks and a newline.
+        while index != -1:
+            eol = data.find("\n", index + 1)
+            if eol == -1:
+                break
+
+            fields = data[index+2:eol].split(" ", 2)
+            try:
+                fetched = int(fields[0])
+                length  = int(fields[1])
+                url     = fields[2]
+            except (ValueError, IndexError):
+                break
+
+            if fetched >= oldest:
+                info = ResourceInformation.ResourceInformation(
+                    data[eol+1:eol+1+length])
+                info.setFetchTime(fetched)
+                infos[url] = info
+            index = data.find("\n=", eol + 1 + length)
+
+        resp.getResponses().setInfos(infos)
+
+        if self.verbose:
+            print("Reattached %d information blocks from %s" % (len(infos),
+                                                               infofile))
+        return len(infos)
@@ -0,0 +1,249 @@
+# Copyright (C) 2001 David Allen <mda@idatar.com>
+# Copyright (C) 2020 Tom4hawk
+#
+# Released under the terms of the GNU General Public License
+#
+# Keeps track of what's in the cache in a small SQLite database, so that
+# finding out whether something is cached, or how much is, is a query
+# instead of a trip through the filesystem.  Each entry is a file in the
+# cache: its filename relative to the cache prefix, the canonical key of
+# what it holds, how big it is, when it was fetched and when it was last
+# read back.  Entries can be pinned, which keeps them from being evicted
+# when the cache is over budget.
+#
+# The files are what matters; the database is only an index of them.  If
+# it's lost or damaged, it's thrown away and Cache.rebuildIndex() builds
+# it again from what's on disk.
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#############################################################################
+import os
+import time
+import sqlite3
+import threading
+
+
+class CacheIndex:
+    verbose = None
+    VERSION = 2       # Bump when the tables change; old indexes are rebuilt
+    TIMEOUT = 5       # Seconds to wait on another FORG using the same index
+
+    SCHEMA = ["""CREATE TABLE IF NOT EXISTS entries (
+                     path     TEXT PRIMARY KEY,
+                     host     TEXT,
+                     port     INTEGER,
+                     type     TEXT,
+                     locator  TEXT,
+                     size     INTEGER NOT NULL,
+                     fetched  REAL NOT NULL,
+                     accessed REAL NOT NULL)""",
+              """CREATE INDEX IF NOT EXISTS entries_host
+                     ON entries (host)""",
+              """CREATE INDEX IF NOT EXISTS entries_accessed
+                     ON entries (accessed)""",
+              # Paths that are never evicted.  They needn't be cached.
+              """CREATE TABLE IF NOT EXISTS pins (
+                     path     TEXT PRIMARY KEY)"""]
+    TABLES = ["entries", "pins"]
+
+    def __init__(self, filename):
+        self.lock     = threading.Lock()
+        self.filename = filename
+        self.db       = None
+        self.new      = None
+        self.open()
+
+    def getFilename(self):
+        return self.filename
+
+    def isNew(self):
+        """Returns true if the index was just created, either because there
+        wasn't one or because the one there was couldn't be used.  New
+        indexes are empty, and need rebuilding from the files."""
+        return self.new
+
+    def open(self):
+        """Opens the index, creating it if need be.  An index that can't
+        be read, or that was made by another version, is replaced."""
+        self.new = not os.path.exists(self.filename)
+
+        try:
+            self.db = self.connect()
+        except sqlite3.DatabaseError as errstr:
+            print("Cache index %s is unusable (%s), replacing it." %
+                  (self.filename, errstr))
+            self.remove()
+            self.new = 1
+            self.db  = self.connect()
+        return None
+
+    def connect(self):
+        db = sqlite3.connect(self.filename, timeout=self.TIMEOUT,
+                             isolation_level=None, check_same_thread=False)
+        try:
+            # Losing the last few entries in a crash is fine; they get
+            # rebuilt.  Waiting on the disk for every page loaded isn't.
+            db.execute("PRAGMA synchronous = OFF")
+
+            version = db.execute("PRAGMA user_version").fetchone()[0]
+            if version != self.VERSION:
+                if version != 0:
+                    self.new = 1
+                for table in self.TABLES:
+                    db.execute("DROP TABLE IF EXISTS %s" % table)
+                for statement in self.SCHEMA:
+                    db.execute(statement)
+                db.execute("PRAGMA user_version = %d" % self.VERSION)
+
+            db.execute("SELECT count(*) FROM entries").fetchone()
+        except sqlite3.DatabaseError:
+            db.close()
+            raise
+        return db
+
+    def remove(self):
+        for suffix in ["", "-journal", "-wal", "-shm"]:
+            try:
+                os.unlink(self.filename + suffix)
+            except OSError:
+                pass
+        return None
+
+    def close(self):
+        with self.lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
+        return None
+
+    def query(self, statement, args=(), many=None):
+        """Runs statement with args, and returns the rows it comes up
+        with.  If many is true, args is a list of argument tuples.  The
+        index is only an index, so trouble with it is reported and
+        otherwise ignored: you get an empty list."""
+        with self.lock:
+            try:
+                if many:
+                    # One transaction for the lot, not one for each.
+                    self.db.execute("BEGIN")
+                    try:
+                        cursor = self.db.executemany(statement, args)
+                        self.db.execute("COMMIT")
+                    except sqlite3.Error:
+                        self.db.execute("ROLLBACK")
+                        raise
+                else:
+                    cursor = self.db.execute(statement, args)
+                return cursor.fetchall()
+            except sqlite3.Error as errstr:
+                print("Cache index error: %s" % errstr)
+                return []
+
+    def get(self, path):
+        """Returns [size, fetched, accessed] for the file cached as path,
+        or None if it isn't in the index."""
+        rows = self.query("SELECT size, fetched, accessed FROM entries "
+                          "WHERE path = ?", (path,))
+        if not rows:
+            return None
+        return list(rows[0])
+
+    def add(self, path, key, size, fetched=None):
+        """Records that path holds the object with canonical key key, and
+        is size bytes.  It counts as just accessed."""
+        self.addMany([[path, key, size, fetched]])
+        return None
+
+    def addMany(self, entries):
+        """Records a list of [path, key, size, fetched] entries at once"""
+        now  = time.time()
+        rows = []
+
+        for [path, key, size, fetched] in entries:
+            (host, port, typecode, locator) = key
+            if fetched is None:
+                fetched = now
+            rows.append((path, host, port, typecode, locator, size, fetched,
+                         fetched))
+
+        self.query("INSERT OR REPLACE INTO entries VALUES "
+                   "(?, ?, ?, ?, ?, ?, ?, ?)", rows, many=1)
+        return None
+
+    def touch(self, path, when=None):
+        """Records that path was read from the cache, now or at when."""
+        if when is None:
+            when = time.time()
+        self.query("UPDATE entries SET accessed = ? WHERE path = ?",
+                   (when, path))
+        return None
+
+    def forget(self, path):
+        self.forgetMany([path])
+        return None
+
+    def forgetMany(self, paths):
+        self.query("DELETE FROM entries WHERE path = ?",
+                   [(path,) for path in paths], many=1)
+        return None
+
+    def getColdest(self, count):
+        """Returns [path, size] for the count entries that have gone
+        longest without being read, leaving out pinned ones."""
+        rows = self.query("SELECT path, size FROM entries "
+                          "WHERE path NOT IN (SELECT path FROM pins) "
+                          "ORDER BY accessed LIMIT ?", (count,))
+        return [list(row) for row in rows]
+
+    def setPins(self, paths):
+        """Makes paths the pinned ones, instead of whatever was before."""
+        self.query("DELETE FROM pins")
+        self.query("INSERT OR IGNORE INTO pins VALUES (?)",
+                   [(path,) for path in paths], many=1)
+        return None
+
+    def countPins(self):
+        rows = self.query("SELECT count(*) FROM pins")
+        if not rows:
+            return 0
+        return rows[0][0]
+
+    def clear(self):
+        self.query("DELETE FROM entries")
+        return None
+
+    def countEntries(self):
+        rows = self.query("SELECT count(*) FROM entries")
+        if not rows:
+            return 0
+        return rows[0][0]
+
+    def getTotals(self):
+        """Returns [x, y] where x is the number of files in the cache and y
+        is their total size."""
+        rows = self.query("SELECT count(*), total(size) FROM entries")
+        if not rows:
+            return [0, 0]
+        return [rows[0][0], int(rows[0][1])]
+
+    def summarize(self):
+        """Returns [x, y, z] where x is the number of files in the cache, y
+        is their total size and z is the number of hosts they came from."""
+        rows = self.query("SELECT count(*), total(size), "
+                          "count(DISTINCT host) FROM entries")
+        if not rows:
+            return [0, 0, 0]
+        [count, size, hosts] = rows[0]
+        return [count, int(size), hosts]
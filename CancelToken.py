@@ -0,0 +1,94 @@
+# Copyright (C) 2001 David Allen <mda@idatar.com>
+# Copyright (C) 2020 Tom4hawk
+#
+# Released under the terms of the GNU General Public License
+#
+# A CancelToken stops one request: whoever starts a transfer makes one, and
+# hands it to the connection doing the work.  This imports nothing else from
+# the program, so that the GUI can make tokens without importing Connection.
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#############################################################################
+import socket
+import threading
+
+
+class CancelToken:
+    """Cancels one request.  Sockets used by the request are attached to
+    the token, and cancel() shuts them down, which wakes up any thread
+    blocked reading from them.  Other ways of stopping work, such as
+    cancelling an asyncio task, can be hooked in with addCallback()."""
+    def __init__(self):
+        self.lock      = threading.Lock()
+        self.cancelled = None
+        self.sockets   = []
+        self.callbacks = []
+
+    def isCancelled(self):
+        return self.cancelled
+
+    def cancel(self):
+        with self.lock:
+            if self.cancelled:
+                return None
+            self.cancelled = 1
+            sockets   = self.sockets
+            callbacks = self.callbacks
+            self.sockets   = []
+            self.callbacks = []
+
+        for sock in sockets:
+            self.shutdown(sock)
+        for callback in callbacks:
+            callback()
+        return None
+
+    def shutdown(self, sock):
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass    # Not connected yet, or already closed.
+
+    def attach(self, sock):
+        """Ties sock to this token.  If the token is already cancelled, sock
+        is shut down right away."""
+        with self.lock:
+            if not self.cancelled:
+                self.sockets.append(sock)
+                return None
+        self.shutdown(sock)
+        return None
+
+    def detach(self, sock):
+        with self.lock:
+            if sock in self.sockets:
+                self.sockets.remove(sock)
+        return None
+
+    def addCallback(self, callback):
+        """Calls callback (with no arguments) when the token is cancelled,
+        or right away if it already was.  Returns a function that removes
+        the callback again."""
+        with self.lock:
+            if not self.cancelled:
+                self.callbacks.append(callback)
+
+                def remove(s=self, callback=callback):
+                    with s.lock:
+                        if callback in s.callbacks:
+                            s.callbacks.remove(callback)
+                return remove
+        callback()
+        return lambda: None
@@ -17,10 +17,15 @@
 #  along with this program; if not, write to the Free Software
 #  Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
 #############################################################################
+import os
+import time
 import socket
+import selectors
 import Options
+import DNSCache
 import utils
 import errno
+import Sink
 
 
 class ConnectionException(Exception):
@@ -29,8 +34,14 @@ class ConnectionException(Exception):
 
 
 class Connection:
+    CHUNKSIZE     = 16 * 1024     # Default size of a single read
+    MAX_CHUNKSIZE = 1024 * 1024   # Never read more than this at once
+    ATTEMPT_DELAY = 0.25          # Seconds between connection attempts
+
     def __init__(self, *args):
         self._d = None
+        self.token = None
+        self.firstByte = None
         self.bytes_transferred = {'sent'     : 0,
                                   'received' : 0 }
 
@@ -51,16 +62,51 @@ class Connection:
     def getBytesRead(self):
         return self.bytes_transferred['received']
     
-    def readloop(self, sock, bytesToRead, msgBar=None):
+    def readStatusLine(self, sock, msgBar=None):
+        """Reads the first line off of sock, for example the Gopher+ "+N"
+        length line.  Reads are done in whole chunks rather than a byte at
+        a time, so anything received after the line is returned as well.
+        Returns [line, pending] where line includes its newline if one was
+        found, and pending holds the bytes that followed it."""
+        data = b""
+
+        while 1:
+            self.checkStopped(msgBar)
+            chunk = sock.recv(self.CHUNKSIZE)
+            self.checkStopped(msgBar)
+
+            if len(chunk) <= 0:
+                # EOF before a full line.  Whatever we have is the line.
+                return [data, b""]
+
+            self.gotData(sock)
+            self.received(len(chunk))
+            data = data + chunk
+            ind = data.find(b"\n")
+
+            if ind != -1:
+                return [data[0:ind+1], data[ind+1:]]
+
+    def readloop(self, sock, bytesToRead, msgBar=None, sink=None,
+                 pending=None):
         """Reads bytesToRead data off of sock or until EOF if
-        bytesToRead < 0.  Optionally uses msgBar to log information to the
-        user."""
-        timesRead = 0
-        data      = b""
-        CHUNKSIZE = 1024  # Default read block size.
-                          # This may get overridden depending on how much data
-                          # we have to read.  Optimally we want to read all of
-                          # the data that's going to come in 100 steps.
+        bytesToRead < 0, handing each chunk to sink as it arrives.  If no
+        sink is given, a MemorySink is used.  pending holds data that was
+        already read off of sock, and goes into the sink first.  Optionally
+        uses msgBar to log information to the user.  Returns the sink."""
+        if sink is None:
+            sink = Sink.MemorySink()
+
+        bytesRead = 0
+
+        if pending:
+            sink.write(pending)
+            bytesRead = len(pending)
+        CHUNKSIZE = self.CHUNKSIZE  # Default read block size.
+                                    # This may get overridden depending on how
+                                    # much data we have to read.  Optimally we
+                                    # want to read all of the data that's
+                                    # going to come in 100 steps.
 
         if bytesToRead < 0:
             numKBtoRead = ""   # Don't report total size since we don't know
@@ -70,33 +116,36 @@ class Connection:
             val = float(bytesToRead) / float(1024)
             numKBtoRead = "of %0.2f kilobytes total size" % val
 
-            if bytesToRead > (1024 * 100): # 100 Kb
-                CHUNKSIZE = bytesToRead / 100
+            if bytesToRead > (CHUNKSIZE * 100):
+                CHUNKSIZE = min(bytesToRead // 100, self.MAX_CHUNKSIZE)
+
+        # One buffer is reused for every read, so receiving doesn't create a
+        # new string per chunk.  The sink decides whether to copy it.
+        buffer = bytearray(CHUNKSIZE)
+        view   = memoryview(buffer)
 
-        chunk = 'foobar'
-        
-        while len(chunk) > 0:
+        while not sink.isComplete():
             self.checkStopped(msgBar)        # Constantly make sure we should
-            chunk = sock.recv(CHUNKSIZE)     
-            self.received(CHUNKSIZE)
+            count = sock.recv_into(view)
             self.checkStopped(msgBar)        # continue...
-            
-            timesRead = timesRead + 1
-            # print "Read %s: %s" % (CHUNKSIZE, timesRead * CHUNKSIZE)
-            data = data + chunk
 
-            if bytesToRead > 0 and len(data) >= bytesToRead:
-                # print "BTR=%s, len(data)=%s, breaking" % (bytesToRead,
-                # len(data))
+            if count <= 0:
+                break
+
+            self.gotData(sock)
+            self.received(count)
+            sink.write(view[:count])
+            bytesRead = bytesRead + count
+
+            # Break standards-compliance because of all those terrible gopher
+            # servers out there.  Keep reading even when bytesToRead have
+            # been read, and return all of the data.  This will produce the
+            # user expected behavior, but it disregards content lengths in
+            # gopher+
 
-                # Disregard content length for broken gopher+ servers.
-                # break
-                pass
-            
             if msgBar:
                 # Report statistics on how far along we are...
-                bytesRead = timesRead * CHUNKSIZE
-                kbRead = (float(timesRead) * float(CHUNKSIZE)) / float(1024)
+                kbRead = float(bytesRead) / float(1024)
 
                 if bytesToRead > 0:
                     pct = (float(bytesRead) / float(bytesToRead))*float(100)
@@ -119,108 +168,250 @@ class Connection:
                                 numKBtoRead,
                                 pctDone))
 
-        # Break standards-compliance because of all those terrible gopher
-        # servers out there.  Return all of the data that we read, not just
-        # the first bytesToRead characters of it.  This will produce the user
-        # expected behavior, but it disregards content lenghts in gopher+
-        if bytesToRead > 0:
-            # return data[0:bytesToRead]
-            return data.decode(encoding="utf-8", errors="ignore")
-        else:
-            return data.decode(encoding="utf-8", errors="ignore")
+        sink.close()
+        return sink
 
     def checkStopped(self, msgBar):
-        """Issue a message to the user and jump out if greenlight
-        isn't true."""
-        if not Options.program_options.GREEN_LIGHT:
+        """Issue a message to the user and jump out if the request in
+        progress has been cancelled."""
+        if self.token is not None and self.token.isCancelled():
             raise ConnectionException("Connection stopped")
 
-    def requestToData(self, resource, request, msgBar=None, grokLine=None):
-        """Sends request to the host/port stored in resource, and returns
-        any data returned by the server.  This may throw
-        ConnectionException.  msgBar is optional.
-        May throw ConnectionException if green_light ever becomes false.
-        This is provided so that the user can immediately stop the connection
-        if it exists."""
+    def lookup(self, host, msgBar=None):
+        """Returns the list of IP addresses of host, from the program wide DNS cache
+        if it's in there.  Throws ConnectionException if host can't be
+        found, or if the request is cancelled while looking it up."""
+        try:
+            addresses = Options.program_options.getDNSCache().lookup(host,
+                                                                     self.token)
+        except DNSCache.DNSCacheException as err:
+            self.checkStopped(msgBar)
+            raise ConnectionException("Cannot lookup\n%s:\n%s" % (host, err))
+        return addresses
 
-        utils.msg(msgBar, "Creating socket...")
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        if not self.socket:
-            raise ConnectionException("Cannot create socket.")
+    def gotData(self, sock):
+        """Called whenever data arrives on sock.  Once the first byte is in,
+        the server only has to keep from going idle."""
+        if not self.firstByte:
+            self.firstByte = 1
+            sock.settimeout(self.getTimeout('idle_timeout'))
+        return None
+
+    def getTimeout(self, optionname):
+        """Returns the timeout in seconds set by optionname, or None if
+        there shouldn't be one."""
+        timeout = Options.program_options.getIntOption(optionname)
+        if timeout <= 0:
+            return None
+        return timeout
+
+    def requestToData(self, resource, request, msgBar=None, grokLine=None,
+                      sink=None, token=None):
+        """Sends request to the host/port stored in resource, and returns
+        a sink holding any data returned by the server.  Data is handed to
+        sink as it arrives; if sink is None, a MemorySink is used.  This may
+        throw ConnectionException.  msgBar is optional.
+        token is an optional CancelToken for this request.  Cancelling it
+        wakes up any blocked read, and this throws ConnectionException, so
+        that the user can immediately stop the connection if it exists.
+        The connect_timeout, first_byte_timeout and idle_timeout options
+        keep a stalled server from hanging the request forever."""
+        self.token     = token
+        self.firstByte = None
 
         self.checkStopped(msgBar)
         utils.msg(msgBar, "Looking up hostname...")
+        addresses = self.lookup(resource.getHost(), msgBar)
+
+        utils.msg(msgBar, "Connecting to %s:%s..." % (resource.getHost(),
+                                                     resource.getPort()))
+        self.socket = self.connect(resource, addresses, msgBar)
+
         try:
-            # Try to get a cached copy of the IP address rather than
-            # looking it up again which takes longer...
-            ipaddr = Options.program_options.getIP(resource.getHost())
-        except KeyError:
-            # OK, it wasn't in the cache.  Figure out what it is,
-            # and then put it in the cache.
-            try:
-                self.checkStopped(msgBar)
-                ipaddr = socket.gethostbyname(resource.getHost())
-            except socket.error as err:
-                host = resource.getHost()
-                estr = "Cannot lookup\n%s:\n%s" % (host, err)
-                raise ConnectionException(estr)
-
-        Options.program_options.setIP(resource.getHost(), ipaddr)
-        
-        # At this point, ipaddr holds the actual network address of the
-        # host we're contacting.
-        utils.msg(msgBar,
-                  "Connecting to %s:%s..." % (ipaddr, resource.getPort()))
+            return self.talk(resource, request, msgBar, grokLine, sink)
+        except socket.timeout:
+            estr = "Timed out talking to\n%s:%s" % (resource.getHost(),
+                                                   resource.getPort())
+            raise ConnectionException(estr)
+        except socket.error as err:
+            self.checkStopped(msgBar)   # Errors caused by cancelling
+            estr = "Error talking to\n%s:%s:\n%s" % (resource.getHost(),
+                                                     resource.getPort(), err)
+            raise ConnectionException(estr)
+        finally:
+            if self.token is not None:
+                self.token.detach(self.socket)
+            utils.msg(msgBar, "Closing socket.")
+            self.socket.close()
+
+    def connect(self, resource, addresses, msgBar=None):
+        """Returns a socket connected to the port of resource on one of
+        addresses.  Throws ConnectionException.  The family of the address
+        that answered is remembered, so it's tried first next time."""
+        host = resource.getHost()
+
         try:
-            retval = self.socket.connect((ipaddr, int(resource.getPort())))
-            #if retval != 0:
-            #    errortype = errno.errorcode[retval]
-            #    raise socket.error, errortype
+            sock = self.race(addresses, int(resource.getPort()),
+                             self.getTimeout('connect_timeout'))
+        except socket.timeout:
+            raise ConnectionException("Timed out connecting to\n%s:%s" %
+                                      (host, resource.getPort()))
         except socket.error as err:
-            newestr = "Cannot connect to\n%s:%s:\n%s" % (resource.getHost(), resource.getPort(), err)
-            raise ConnectionException(newestr)
-        
-        data = ""
+            self.checkStopped(msgBar)
+            raise ConnectionException("Cannot connect to\n%s:%s:\n%s" %
+                                      (host, resource.getPort(), err))
+
+        Options.program_options.getDNSCache().setPreferred(host, sock.family)
+        return sock
 
+    def race(self, addresses, port, timeout=None):
+        """Connects to port on whichever of addresses accepts first, the way
+        RFC 8305 ("Happy Eyeballs") does it: a new attempt is started every
+        ATTEMPT_DELAY seconds, or as soon as one fails, without waiting for
+        the earlier ones to give up.  Returns the connected socket.  Throws
+        socket.timeout after timeout seconds, the last socket.error if no
+        address works, and ConnectionException if self.token is cancelled."""
+        selector  = selectors.DefaultSelector()
+        remaining = list(addresses)
+        attempts  = {}       # socket => address
+        error     = None
+        winner    = None
+        deadline  = None
+        nextTry   = time.monotonic()
+
+        if timeout is not None:
+            deadline = nextTry + timeout
+
+        # Cancelling the token writes to waker, which wakes up the select.
+        [wakeup, waker] = socket.socketpair()
+        selector.register(wakeup, selectors.EVENT_READ)
+        remove = lambda: None
+
+        if self.token is not None:
+            def wake(waker=waker):
+                try:
+                    waker.send(b"x")
+                except OSError:
+                    pass
+            remove = self.token.addCallback(wake)
+
+        try:
+            while winner is None and (remaining or attempts):
+                if self.token is not None and self.token.isCancelled():
+                    raise ConnectionException("Connection stopped")
+
+                now = time.monotonic()
+                if deadline is not None and now >= deadline:
+                    raise socket.timeout("timed out")
+
+                if remaining and (now >= nextTry or not attempts):
+                    address = remaining.pop(0)
+                    try:
+                        sock = self.startConnect(address, port)
+                    except socket.error as err:
+                        error = err          # Go straight to the next one.
+                        continue
+                    attempts[sock] = address
+                    selector.register(sock, selectors.EVENT_WRITE)
+                    nextTry = now + self.ATTEMPT_DELAY
+                    continue
+
+                wait = None
+                if deadline is not None:
+                    wait = deadline - now
+                if remaining and (wait is None or nextTry - now < wait):
+                    wait = nextTry - now
+
+                for [key, events] in selector.select(wait):
+                    sock = key.fileobj
+                    if sock is wakeup:
+                        continue
+
+                    selector.unregister(sock)
+                    del attempts[sock]
+                    err = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+
+                    if err == 0 and winner is None:
+                        winner = sock
+                        continue
+
+                    if err != 0:
+                        error = socket.error(err, os.strerror(err))
+                        nextTry = time.monotonic()
+                    self.closeAttempt(sock)
+        finally:
+            remove()
+            for sock in attempts:
+                self.closeAttempt(sock)
+            selector.close()
+            wakeup.close()
+            waker.close()
+
+        if winner is None:
+            if error is None:
+                error = socket.error("No addresses to connect to")
+            raise error
+
+        winner.setblocking(True)
+        return winner
+
+    def startConnect(self, address, port):
+        """Returns a new non-blocking socket that has started connecting to
+        port on address.  Throws socket.error if that fails right away."""
+        sock = socket.socket(DNSCache.getFamily(address), socket.SOCK_STREAM)
+        sock.setblocking(False)
+
+        if self.token is not None:
+            self.token.attach(sock)
+
+        err = sock.connect_ex((address, port))
+        if err not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EAGAIN):
+            self.closeAttempt(sock)
+            raise socket.error(err, os.strerror(err))
+        return sock
+
+    def closeAttempt(self, sock):
+        if self.token is not None:
+            self.token.detach(sock)
+        sock.close()
+        return None
+
+    def talk(self, resource, request, msgBar, grokLine, sink):
+        """Sends request over the connected self.socket, and reads the
+        response into sink.  See requestToData()"""
         self.checkStopped(msgBar)
-        self.socket.send(request.encode())    # Send full request - usually quite short
+        self.socket.settimeout(self.getTimeout('first_byte_timeout'))
+        self.socket.sendall(request.encode())    # Send full request - usually quite short
         self.checkStopped(msgBar)
         self.sent(len(request))      # We've sent this many bytes so far...
 
         if grokLine:   # Read the first line...this is for Gopher+ retrievals
-            line = b""  # and usually tells us how many bytes to read later
-            byte = ""
-            
-            while byte != "\n":
-                self.checkStopped(msgBar)
-                byte = self.socket.recv(1)
-                if len(byte) <= 0:
-                    print("****************BROKE out of byte loop")
-                    break
-                line = line + byte
-    
-            bytesread = len(line)
-            line = line.decode(encoding="utf-8", errors="ignore")  # str() should be enough but you never know...
-            line = line.strip()
+            # and usually tells us how many bytes to read later
+            [line, pending] = self.readStatusLine(self.socket, msgBar)
+            status = line.decode(encoding="utf-8", errors="ignore").strip()
+            bytecount = -1
+
+            if status[0:1] == '+' or status[0:1] == '-':
+                # "+N" is a length, "-N" is a Gopher+ error.  In both cases
+                # N may be -1 (read until close) or -2 (read until close,
+                # data may contain the footer).
+                try:
+                    bytecount = int(status[1:])
+                except ValueError:
+                    print("*** Couldn't read bytecount: skipping.")
 
-            try:
-                if line[0] == '+':
-                    bytecount = int(line[1:]) # Skip first char: "+-1" => "-1"
+                if status[0] == '+':
                     resource.setLen(bytecount)
-                    
-                    # Read all of the data into the 'data' variable.
-                    data = self.readloop(self.socket, bytecount, msgBar)
-                else:
-                    data = self.readloop(self.socket, -1, msgBar)
-            except:
-                print("*** Couldn't read bytecount: skipping.")
-                data = self.readloop(self.socket, -1, msgBar)
-        else:
-            data = self.readloop(self.socket, -1, msgBar)
+            else:
+                # Not a Gopher+ server after all.  The first line is data.
+                pending = line + pending
 
-        utils.msg(msgBar, "Closing socket.")
-        self.socket.close()
+            # Read all of the data into the sink.
+            sink = self.readloop(self.socket, bytecount, msgBar, sink,
+                                 pending)
+        else:
+            sink = self.readloop(self.socket, -1, msgBar, sink)
 
-        # FIXME: 'data' may be huge.  Buffering?  Write to cache file here
-        # and return a cache file name?
-        return data
+        # Large documents should be read with a SpillSink or FileSink so
+        # they don't have to sit in memory.
+        return sink
@@ -0,0 +1,264 @@
+# Copyright (C) 2001 David Allen <mda@idatar.com>
+# Copyright (C) 2020 Tom4hawk
+#
+# Released under the terms of the GNU General Public License
+#
+# Caches hostname lookups.  Entries expire after a while, failed lookups
+# are remembered for a shorter while so that a dead host doesn't cost a
+# lookup per request, and the cache can be written to disk so the next
+# start of the program doesn't have to look up the usual hosts again.
+# Lookups are run on a small pool of threads, and several requests for
+# the same host share one lookup.
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#############################################################################
+import time
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+def getFamily(address):
+    """Returns the address family of address, a numeric IP address."""
+    if ':' in address:
+        return socket.AF_INET6
+    return socket.AF_INET
+
+
+class DNSCacheException(Exception):
+    def __init__(self, message):
+        super(DNSCacheException, self).__init__(message)
+
+
+class DNSCache:
+    verbose      = None
+    TTL          = 3600   # Seconds a successful lookup is good for
+    NEGATIVE_TTL = 60     # Seconds a failed lookup is good for
+    WORKERS      = 4      # Lookups that may run at the same time
+
+    def __init__(self, *args):
+        self.lock    = threading.Lock()
+        self.entries = {}    # host => [expiry, addresses, error]
+        self.pending = {}    # host => Future of a lookup in progress
+        self.families = {}   # host => address family that worked last
+        self.pool    = None
+        self.ttl          = self.TTL
+        self.negative_ttl = self.NEGATIVE_TTL
+
+    def setTTL(self, ttl, negative_ttl):
+        """Sets how long (in seconds) successful and failed lookups are
+        remembered."""
+        self.ttl          = ttl
+        self.negative_ttl = negative_ttl
+        return None
+
+    def get(self, host):
+        """Returns the list of cached addresses of host.  Throws KeyError if
+        nothing fresh is cached, and DNSCacheException if the last lookup
+        of host failed recently."""
+        host = host.lower()
+
+        with self.lock:
+            [expiry, addresses, error] = self.entries[host]
+
+            if expiry < time.time():
+                del self.entries[host]
+                raise KeyError(host)
+
+        if error is not None:
+            raise DNSCacheException(error)
+        return addresses
+
+    def set(self, host, addresses, ttl=None):
+        """Caches addresses (a list) for host for ttl seconds.  They are
+        kept in the order they should be tried in."""
+        if ttl is None:
+            ttl = self.ttl
+        host = host.lower()
+
+        with self.lock:
+            addresses = self.order(addresses, self.families.get(host))
+            self.entries[host] = [time.time() + ttl, addresses, None]
+        return addresses
+
+    def order(self, addresses, family=None):
+        """Returns addresses sorted the way RFC 8305 wants them tried: one of
+        family first, then alternating between families.  If family is
+        None, the family of the first address (the system's preference) is
+        used."""
+        if not addresses:
+            return addresses
+        if family is None:
+            family = getFamily(addresses[0])
+
+        first  = [a for a in addresses if getFamily(a) == family]
+        second = [a for a in addresses if getFamily(a) != family]
+        result = []
+
+        while first or second:
+            if first:
+                result.append(first.pop(0))
+            if second:
+                result.append(second.pop(0))
+        return result
+
+    def setPreferred(self, host, family):
+        """Remembers that connecting to host worked over family, so that
+        addresses of family are tried first next time."""
+        host = host.lower()
+
+        with self.lock:
+            self.families[host] = family
+            entry = self.entries.get(host)
+
+            if entry is not None and entry[1]:
+                entry[1] = self.order(entry[1], family)
+        return None
+
+    def setFailed(self, host, error):
+        """Remembers that looking up host failed with error."""
+        with self.lock:
+            self.entries[host.lower()] = [time.time() + self.negative_ttl,
+                                          None, "%s" % error]
+        return None
+
+    def forget(self, host):
+        with self.lock:
+            if host.lower() in self.entries:
+                del self.entries[host.lower()]
+        return None
+
+    def resolve(self, host):
+        """Does the actual lookup of host.  Runs on the lookup threads."""
+        try:
+            infos = socket.getaddrinfo(host, None, socket.AF_UNSPEC,
+                                       socket.SOCK_STREAM)
+        except socket.error as err:
+            self.setFailed(host, err)
+            raise DNSCacheException("%s" % err)
+
+        addresses = []
+        for [family, type, proto, canonname, sockaddr] in infos:
+            if family in (socket.AF_INET, socket.AF_INET6) and \
+               sockaddr[0] not in addresses:
+                addresses.append(sockaddr[0])
+
+        if not addresses:
+            self.setFailed(host, "No usable addresses")
+            raise DNSCacheException("No usable addresses")
+
+        if self.verbose:
+            print("DNSCache: %s is %s" % (host, addresses))
+        return self.set(host, addresses)
+
+    def submit(self, host):
+        """Returns a concurrent.futures.Future for the addresses of host.
+        Only one lookup per host is ever in progress."""
+        host = host.lower()
+
+        with self.lock:
+            future = self.pending.get(host)
+            if future is not None:
+                return future
+
+            if self.pool is None:
+                self.pool = ThreadPoolExecutor(max_workers=self.WORKERS,
+                                               thread_name_prefix="Resolver")
+            future = self.pool.submit(self.resolve, host)
+            self.pending[host] = future
+
+        def done(future, s=self, host=host):
+            with s.lock:
+                if s.pending.get(host) is future:
+                    del s.pending[host]
+
+        future.add_done_callback(done)
+        return future
+
+    def lookup(self, host, token=None):
+        """Returns the list of addresses of host, from the cache if
+        possible.  Throws DNSCacheException if host can't be found, or if
+        token (a CancelToken.CancelToken) is cancelled while waiting."""
+        try:
+            return self.get(host)
+        except KeyError:
+            pass
+
+        future = self.submit(host)
+        event  = threading.Event()
+        future.add_done_callback(lambda f, event=event: event.set())
+
+        if token is not None:
+            remove = token.addCallback(event.set)
+        else:
+            remove = lambda: None
+
+        try:
+            event.wait()
+        finally:
+            remove()
+
+        if not future.done():
+            raise DNSCacheException("Lookup of %s stopped" % host)
+        return future.result()
+
+    def save(self, filename):
+        """Writes the fresh, successful entries of the cache to filename.
+        Throws IOError."""
+        now = time.time()
+
+        with self.lock:
+            items = list(self.entries.items())
+
+        fp = open(filename, "w")
+        fp.write("# Hostname lookups cached by the FORG.\n")
+        fp.write("# host expiry address...\n")
+
+        for [host, [expiry, addresses, error]] in items:
+            if error is None and expiry > now:
+                fp.write("%s %d %s\n" % (host, int(expiry),
+                                         " ".join(addresses)))
+        fp.flush()
+        fp.close()
+        return filename
+
+    def load(self, filename):
+        """Reads entries written by save() back in.  Expired entries are
+        skipped.  Throws IOError."""
+        now = time.time()
+        fp = open(filename, "r")
+
+        for line in fp.readlines():
+            line = line.strip()
+            if line == '' or line[0] == '#':
+                continue
+
+            fields = line.split()
+            if len(fields) < 3:
+                continue
+
+            try:
+                expiry = int(fields[1])
+            except ValueError:
+                continue
+
+            if expiry > now:
+                # Addresses were saved in order, so the first one's family
+                # is the one that worked.
+                with self.lock:
+                    self.entries[fields[0]] = [expiry, fields[2:], None]
+                    self.families[fields[0]] = getFamily(fields[2])
+        fp.close()
+        return self
@@ -26,6 +26,7 @@ import functools
 import GopherResource
 import GopherResponse
 import GopherConnection
+import AsyncGopherConnection
 import ContentFrame
 import Cache
 import Options
@@ -60,6 +61,10 @@ class GUIDirectory(ContentFrame.ContentFrame, Frame):
                  resource, filename=None, menuAssocs={}):
         Frame.__init__(self, parent_widget)  # Superclass constructor
         self.searchlist = []    # Searchable terms...
+        self.infoLabels = {}    # id(resource) => Label showing its info
+        self.hostLabels = {}    # row number => URL label shown on hover
+        self.packed     = 0     # Rows on the screen so far
+        self.prefetched = None
         self.parent = parent_object
         self.cursel = None
         self.resp   = resp
@@ -109,8 +114,23 @@ class GUIDirectory(ContentFrame.ContentFrame, Frame):
     def _on_mousewheel(self, event, scroll):
         self.scrolled_window.interior().yview_scroll(int(scroll), "units")
 
+    def setResponse(self, resp):
+        self.resp = resp
+        return self.resp
+
     def pack_content(self, *args):
+        self.packed     = 0
+        self.prefetched = None
+        return self.appendRows()
+
+    def appendRows(self, *args):
+        """Draws the rows of the directory that aren't on the screen yet.
+        A directory is shown while it's still arriving, and this is called
+        again each time more rows are in.  Once they're all there, their
+        information blocks are fetched."""
         responses = self.resp.getResponses()
+        start     = self.packed
+        end       = len(responses)
 
         def color_widget(event, self=self, *args):
             wid = event.widget
@@ -125,21 +145,19 @@ class GUIDirectory(ContentFrame.ContentFrame, Frame):
         show_host_port      = tmpopts.getOption("show_host_port")
         show_cached         = tmpopts.getOption('show_cached')
 
-        for x in range(0, len(responses)):
+        for x in range(start, end):
             if x % 50 == 1:
                 self.scrolled_window.resizescrollregion()
             
-            r = responses[x]
-            rname    = r.getName()
-            rtype    = r.getType()
-            
-            l = Label(self.sbox, text=rtype)
-            
-            if r.getTypeCode() == RESPONSE_BLURB:
+            if responses.getTypeCode(x) == RESPONSE_BLURB:
+                # Blurbs come straight out of the store's columns; no sense
+                # in making resources for them.
+                rname = responses.getName(x)
+
                 # Some servers prefix blurbs that are not meant to be displayed
                 # with (NULL).  Ferret these out, and just display a blank
                 # line.
-                if rname.find("(NULL)") == 0:
+                if rname.find("(NULL)") == 0 or rname == '':
                     rname = " "
                 
                 blurb_label = Label(self.sbox, foreground=self.DEFAULT_COLOR,
@@ -150,6 +168,10 @@ class GUIDirectory(ContentFrame.ContentFrame, Frame):
                                         self.DEFAULT_COLOR])
                 
             else:
+                r = responses[x]
+                rname = r.getName()
+                l = Label(self.sbox, text=r.getType())
+
                 # Trick Tk into passing arguments with the function and
                 # get around Python's weird namespacing.
                 def fn(event, self=self.parent, r=r, w=self, *args):
@@ -163,20 +185,18 @@ class GUIDirectory(ContentFrame.ContentFrame, Frame):
 
                 def enter_signal(event, resource=r,
                                  box=self.sbox, rowno=x, p=self):
-                    host = resource.getHost()
-                    port = resource.getPort()
-                    resource.__blurb__ = Label(box,
-                                               text=resource.toURL())
-                    resource.__blurb__.grid(row=rowno,
-                                            column=p.HOSTPORT_COLUMN,
-                                            columnspan=p.HOSTPORT_SPAN,
-                                            sticky=E)
-
-                def leave_signal(event, resource=r):
-                    try:
-                        resource.__blurb__.destroy()
-                    except:
-                        pass
+                    leave_signal(event)
+                    blurb = Label(box, text=resource.toURL())
+                    blurb.grid(row=rowno,
+                               column=p.HOSTPORT_COLUMN,
+                               columnspan=p.HOSTPORT_SPAN,
+                               sticky=E)
+                    p.hostLabels[rowno] = blurb
+
+                def leave_signal(event, rowno=x, p=self):
+                    blurb = p.hostLabels.pop(rowno, None)
+                    if blurb is not None:
+                        blurb.destroy()
                 
                 # Don't make it clickable if it's an error.  But if it
                 # isn't an error, connect these signals.
@@ -219,25 +239,12 @@ class GUIDirectory(ContentFrame.ContentFrame, Frame):
                 cacheobj = self.parent.getCache()
                 
                 if info_in_directories:    # Cached option
-                    if r.getInfo() != None:
-                        i = r.getInfo()
-                        t = i.getAdmin()
-                        
-                        if len(t) > 40:
-                            t = t[0:40]
-                            Label(self.sbox,
-                                  text=t).grid(row=x,
-                                               column=self.INFO_COLUMN,
-                                               columnspan=self.INFO_SPAN)
-                        else:
-                            Label(self.sbox,
-                                  text=t).grid(row=x,
-                                               column=self.INFO_COLUMN,
-                                               columnspan=self.INFO_SPAN)
-                    else:
-                        Label(self.sbox, text="  ").grid(row=x,
-                                                    column=self.INFO_COLUMN,
-                                                    columnspan=self.INFO_SPAN)
+                    # Info may not be here yet.  The label is filled in when
+                    # it arrives.  See prefetchInfo()
+                    info_label = Label(self.sbox, text=self.infoText(r.getInfo()))
+                    info_label.grid(row=x, column=self.INFO_COLUMN,
+                                    columnspan=self.INFO_SPAN)
+                    self.infoLabels[id(r)] = info_label
 
                 # Possibly report to the user whether or not a given file is
                 # present in cache.  I like to know this, but some people
@@ -254,7 +261,77 @@ class GUIDirectory(ContentFrame.ContentFrame, Frame):
                                              column=self.CACHE_COLUMN,
                                              columnspan=self.CACHE_SPAN)
 
+        self.packed = end
         self.scrolled_window.resizescrollregion()
+
+        if responses.isComplete() and not self.prefetched:
+            self.prefetched = 1
+            self.prefetchInfo()
+        return None
+
+    def infoText(self, info):
+        """Returns the text shown in the info column for info"""
+        if info is None:
+            return "  "
+        return info.getBlock("ADMIN").strip()[0:40]
+
+    def prefetchInfo(self):
+        """Fetches information blocks in the background once the directory
+        is on the screen: always for ASK items, so their forms open right
+        away, and for all Gopher+ items if the grab_resource_info or
+        display_info_in_directories options are on.  The info column is
+        filled in as blocks arrive.  Servers are asked for the whole
+        directory's blocks at once first.  Navigating elsewhere stops the
+        fetching."""
+        opts    = Options.program_options
+        grabAll = opts.getOption('grab_resource_info') or \
+                  opts.getOption('display_info_in_directories')
+        wanted  = []
+
+        responses = self.resp.getResponses()
+
+        for x in range(len(responses)):
+            if responses.getTypeCode(x) == RESPONSE_BLURB:
+                continue
+
+            r = responses[x]
+            if r.getInfo() is not None or not r.isGopherPlusResource():
+                continue
+            if grabAll or r.isAskType():
+                wanted.append(r)
+
+        if not wanted:
+            return None
+
+        def arrived(resource, info, self=self):
+            label = self.infoLabels.get(id(resource))
+            if label is not None:
+                label.configure(text=self.infoText(info))
+            return None
+
+        def done(count, self=self):
+            if count > 0:
+                self.saveInfo()
+            return None
+
+        conn = AsyncGopherConnection.AsyncGopherConnection()
+        self.parent.runAsync(conn.prefetchInfo(wanted,
+                                               self.parent.relay(arrived),
+                                               self.parent.token,
+                                               directory=self.resource),
+                             done)
+        return None
+
+    def saveInfo(self):
+        """Saves the information blocks of the items of this directory with
+        its cached copy, so they don't have to be fetched next time."""
+        if not Options.program_options.getOption('use_cache'):
+            return None
+
+        try:
+            self.parent.getCache().cacheInfo(self.resp, self.resource)
+        except IOError as errstr:
+            print("***Couldn't cache information blocks: %s" % errstr)
         return None
         
     def destroy(self, *args):
@@ -339,22 +416,30 @@ class GUIDirectory(ContentFrame.ContentFrame, Frame):
             self.parent.genericError(str, "Error:")
             return None
         
+        def show(info, resource=resource):
+            resource.setInfo(info)
+            gri = ResourceInformation.GUIResourceInformation(info)
+            return None
+
+        def fetched(info, resource=resource, self=self):
+            show(info)
+            self.saveInfo()
+            return None
+
+        def error(errstr, resource=resource, self=self):
+            url = resource.toURL()
+            str = "Cannot display information about\n%s:\n%s" % (url,
+                                                                 errstr)
+            self.parent.genericError(str, "Error:")
+            return None
+
         if resource.getInfo() is None:
-            try:
-                conn = GopherConnection.GopherConnection()
-                info = conn.getInfo(resource)
-                resource.setInfo(info)
-            except Exception as errstr:
-                url = resource.toURL()
-                str = "Cannot display information about\n%s:\n%s" % (url,
-                                                                     errstr)
-                self.parent.genericError(str, "Error:")
-                return None
-
-        info = resource.getInfo()
-        str = "Resource information:\n%s\n%s" % (resource.toURL(),
-                                                 info.toString())
-        gri = ResourceInformation.GUIResourceInformation(info)
+            # Fetch it in the background so the window doesn't freeze while
+            # we wait for the server.
+            conn = AsyncGopherConnection.AsyncGopherConnection()
+            self.parent.runAsync(conn.getInfo(resource), fetched, error)
+        else:
+            show(resource.getInfo())
         return None
             
     def find(self, term, caseSensitive=None, lastIdentifier=None):
@@ -223,9 +223,14 @@ class GUISaveFile(ContentFrame.ContentFrame, Frame):
     def save(self, *args):
         filename = self.filenameEntry.get()
 
+        data = self.response.getData()
+
         try:
-            fp = open(filename, "w")
-            fp.write(self.response.getData())
+            if isinstance(data, str):
+                fp = open(filename, "w")
+            else:
+                fp = open(filename, "wb")   # Binary data, keep it as bytes.
+            fp.write(data)
             fp.flush()
             fp.close()
         except IOError as errstr:
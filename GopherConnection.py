@@ -24,10 +24,15 @@ import re
 import utils
 import GopherResponse
 import Connection
+import Sink
+import SingleFlight
+import InfoCache
 import GopherObject
 import GopherResource
+import MenuParser
 import ResourceInformation
 import AskForm
+import Options
 from gopher import *
 
 class GopherConnectionException(Exception):
@@ -61,13 +66,118 @@ class GopherConnection(Connection.Connection):
         return data
 
     # Get extended information about a resource.
-    def getInfo(self, resource, msgBar=None):
+    def getInfo(self, resource, msgBar=None, token=None):
+        info = InfoCache.memo.get(resource)
+        if info is not None:
+            return info
+
+        key = self.requestKey(resource, "!")
+        if key is None:
+            return self.fetchInfo(resource, msgBar, token)
+
+        def fetch(s=self, resource=resource, msgBar=msgBar, token=token):
+            return s.fetchInfo(resource, msgBar, token)
+
         try:
-            req = "%s\t!\r\n" % resource.getLocator()
-            data = self.requestToData(resource, req, msgBar)
+            return SingleFlight.inflight.do(key, fetch, token)
         except Connection.ConnectionException as errstr:
             raise GopherConnectionException(errstr)
-        
+
+    def fetchInfo(self, resource, msgBar=None, token=None):
+        """Does the work for getInfo()"""
+        try:
+            sink = self.requestToData(resource, self.infoRequest(resource),
+                                      msgBar, token=token)
+        except Connection.ConnectionException as errstr:
+            raise GopherConnectionException(errstr)
+
+        return InfoCache.memo.set(resource, self.makeInfo(resource, sink))
+
+    def requestKey(self, resource, kind):
+        """Returns the key identifying the request of kind for resource.
+        Requests with equal keys in flight at the same time are coalesced
+        into one transfer.  Returns None if the request must not be shared,
+        like when it carries answers to ASK questions."""
+        if resource.getDataBlock():
+            return None
+        return (resource.getKey(), resource.isGopherPlusResource(), kind)
+
+    def getDirectoryInfo(self, resource, msgBar=None, token=None):
+        """Asks the server for the information blocks of every item in the
+        directory resource in one go (a Gopher+ "$" request).  Returns a
+        dictionary mapping the itemKey() of each item to its
+        ResourceInformation.  Servers that don't understand the request
+        yield an empty dictionary.  May throw GopherConnectionException"""
+        def fetch(s=self, resource=resource, msgBar=msgBar, token=token):
+            try:
+                sink = s.requestToData(resource,
+                                       s.directoryInfoRequest(resource),
+                                       msgBar, token=token)
+            except Connection.ConnectionException as errstr:
+                raise GopherConnectionException(errstr)
+            return s.makeDirectoryInfo(sink)
+
+        key = self.requestKey(resource, "$")
+        if key is None:
+            return fetch()
+
+        try:
+            return SingleFlight.inflight.do(key, fetch, token)
+        except Connection.ConnectionException as errstr:
+            raise GopherConnectionException(errstr)
+
+    def directoryInfoRequest(self, resource):
+        """Returns the request string asking for information about every
+        item in the directory resource"""
+        return "%s\t$\r\n" % resource.getLocator()
+
+    def makeDirectoryInfo(self, sink):
+        """Splits the answer to a directory information request into one
+        ResourceInformation per item.  Every item's blocks start with its
+        +INFO block, which says which item it is."""
+        data  = self.stripTail(sink.getText()).replace("\r\n", "\n")
+        infos = {}
+
+        for block in ("\n" + data).split("\n+INFO:")[1:]:
+            try:
+                info = ResourceInformation.ResourceInformation("+INFO:" + block)
+            except Exception as estr:
+                print("***GopherConnection: bad info block: %s" % estr)
+                continue
+
+            # ResourceInformation drops what's on the header line itself,
+            # which for +INFO is the item's description.
+            key = self.infoKey(block.split("\n", 1)[0])
+            if key is not None:
+                infos[key] = info
+
+        if self.verbose:
+            print("Got %d info blocks for directory" % len(infos))
+        return infos
+
+    def itemKey(self, resource):
+        """Returns the key under which getDirectoryInfo() files the
+        information block of resource"""
+        return resource.getKey()
+
+    def infoKey(self, line):
+        """Returns the itemKey() of the item described by line, the rest of
+        an +INFO line, or None if line doesn't describe one."""
+        fields = line.strip().split("\t")
+        if len(fields) < 4 or not fields[0]:
+            return None
+        return (fields[2].lower(), GopherObject.toPort(fields[3]),
+                fields[0][0], fields[1])
+
+    def infoRequest(self, resource):
+        """Returns the request string asking for information about resource"""
+        return "%s\t!\r\n" % resource.getLocator()
+
+    def makeInfo(self, resource, sink):
+        """Turns the data the server sent in response to an info request
+        into a ResourceInformation object."""
+        data = sink.getText()
+
         if self.verbose:
             print("Got %d bytes from INFO conn:\n%s" % (len(data), data))
 
@@ -92,54 +202,140 @@ class GopherConnection(Connection.Connection):
         
         return info
             
-    def getResource(self, resource, msgBar=None):
+    def getResource(self, resource, msgBar=None, token=None,
+                    rowCallback=None):
+        """Fetches resource and returns a GopherResponse for it.  token is an
+        optional CancelToken.CancelToken that stops the transfer.  If the
+        same resource is already being fetched, its response is shared.
+        If resource is a directory, rowCallback is called with its
+        MenuStore every time more rows have come in; see
+        MenuParser.MenuSink"""
+        if self.needsAskForm(resource):
+            # Every form gets its own answers, so never share these.
+            return self.fetchResource(resource, msgBar, token, rowCallback)
+
+        key = self.requestKey(resource, "+")
+        if key is None:
+            return self.fetchResource(resource, msgBar, token, rowCallback)
+
+        def fetch(s=self, resource=resource, msgBar=msgBar, token=token,
+                  rowCallback=rowCallback):
+            return s.fetchResource(resource, msgBar, token, rowCallback)
+
+        try:
+            return SingleFlight.inflight.do(key, fetch, token)
+        except Connection.ConnectionException as estr:
+            return self.makeErrorResponse(resource, estr)
+
+    def fetchResource(self, resource, msgBar=None, token=None,
+                      rowCallback=None):
+        """Does the work for getResource()"""
         self.forgetResponse()
         self.host     = re.sub("gopher://", "", resource.getHost(), 1)
         self.port     = resource.getPort()
         self.lastType = resource.getType()
 
+        if self.needsAskForm(resource):
+            info = resource.getInfo()
+
+            if info is None:
+                try:
+                    info = resource.setInfo(self.getInfo(resource, msgBar,
+                                                         token))
+                except GopherConnectionException as estr:
+                    return self.makeErrorResponse(resource, estr)
+            return self.makeAskForm(resource, info)
+
+        [request, grokLine] = self.resourceRequest(resource)
+
         try:
-            if resource.getDataBlock():
-                request = resource.getLocator() + "\t+\t1\r\n"
-                request = request + resource.getDataBlock()
-                
-                self.response = self.requestToData(resource,
-                                                   request,
-                                                   msgBar, 1)
-            elif resource.isGopherPlusResource() and resource.isAskType():
-                info = resource.getInfo(shouldFetch=1)
-                af = AskForm.AskForm(info.getBlock("ASK"))
-
-                # Copy host/port/locator information into af
-                af.dup(resource)
-                return af
-            elif resource.isGopherPlusResource():
-                request = resource.getLocator() + "\t+\r\n"
-                self.response = self.requestToData(resource,
-                                                   request,
-                                                   msgBar, 1)
-            else:
-                request = resource.getLocator() + "\r\n"
-                self.response = self.requestToData(resource, request, msgBar, None)
+            self.response = self.requestToData(resource, request, msgBar,
+                                               grokLine,
+                                               self.makeSink(resource,
+                                                             rowCallback),
+                                               token)
         except Connection.ConnectionException as estr:
-            error_resp = GopherResponse.GopherResponse()
-            errstr = "Cannot fetch\n%s:\n%s" % (resource.toURL(), estr)
-
-            error_resp.setError(errstr)
-            return error_resp
+            return self.makeErrorResponse(resource, estr)
 
         utils.msg(msgBar, "Examining response...")
+        return self.makeResponse(resource, self.response)
 
+    def needsAskForm(self, resource):
+        """Returns true if fetching resource means asking the user questions
+        rather than talking to the server."""
+        if resource.getDataBlock():
+            return None     # The questions have already been answered.
+        return resource.isGopherPlusResource() and resource.isAskType()
+
+    def makeAskForm(self, resource, info):
+        """Builds the AskForm for resource out of its information block."""
+        af = AskForm.AskForm(info.getBlock("ASK"))
+
+        # Copy host/port/locator information into af
+        af.dup(resource)
+        return af
+
+    def resourceRequest(self, resource):
+        """Returns [request, grokLine] where request is the string to send to
+        the server to fetch resource, and grokLine is true if the server will
+        answer with a Gopher+ status line first."""
+        if resource.getDataBlock():
+            request = resource.getLocator() + "\t+\t1\r\n"
+            return [request + resource.getDataBlock(), 1]
+        elif resource.isGopherPlusResource():
+            return [resource.getLocator() + "\t+\r\n", 1]
+        else:
+            return [resource.getLocator() + "\r\n", None]
+
+    def makeSink(self, resource, rowCallback=None):
+        """Returns the sink the data of resource should be read into, or
+        None for the default.  rowCallback is for directories; see
+        getResource()"""
+        if resource.getTypeCode() == RESPONSE_DIR:
+            # Directories are parsed while they arrive.
+            return MenuParser.MenuSink(rowCallback)
+        elif resource.isBinaryType():
+            # Binaries can be huge, so write them to disk once they get big.
+            opts = Options.program_options
+            return Sink.SpillSink(opts.getIntOption('spill_threshold'),
+                                        opts.getCache().getSpoolDirectory())
+        return None
+
+    def makeErrorResponse(self, resource, estr):
+        error_resp = GopherResponse.GopherResponse()
+        errstr = "Cannot fetch\n%s:\n%s" % (resource.toURL(), estr)
+
+        error_resp.setError(errstr)
+        return error_resp
+
+    def makeResponse(self, resource, sink):
+        """Turns the data the server sent for resource into a GopherResponse.
+        Directories are parsed, everything else is kept as data."""
         resp = GopherResponse.GopherResponse()
         resp.setType(resource.getTypeCode())
 
+        if isinstance(sink, MenuParser.MenuSink):
+            # Already parsed, on the way in.
+            resp.setResponses(sink.getStore())
+            return resp
+        elif resource.isBinaryType():
+            # Binary data goes through untouched: no decoding, no footer
+            # stripping, and no attempt to parse it as a directory.
+            if sink.getFilename():
+                resp.setDataFile(sink.getFilename())
+            else:
+                resp.setData(sink.getData())
+            return resp
+
+        data = sink.getText()
+
         if resource.getLen() != -2:
-            self.response = self.stripTail(self.response)
+            data = self.stripTail(data)
 
         try:
             # The parser picks up directory entries and sets the internal
             # data of the object as needed.
-            resp.parseResponse(self.response)
+            resp.parseResponse(data)
 
             # if we get this far, then it's a directory entry, so set the
             # data to nothing.
@@ -148,6 +344,6 @@ class GopherConnection(Connection.Connection):
             # print "Caught exception while parsing response: \"%s\"" % erstr
             if self.verbose:
                 print("OK, it's data.")
-            resp.setData(self.response)
+            resp.setData(data)
                 
         return resp
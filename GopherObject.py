@@ -20,13 +20,18 @@
 #  Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
 #############################################################################
 
-import re
 import os
-import utils
+import sys
 
 from gopher import *
 
 class GopherObject:
+    # Menus, history and bookmarks hold thousands of these, so there's no
+    # per-object dict.  Subclasses that don't declare __slots__ get one.
+    __slots__ = ('type', 'host', 'port', 'locator', 'name', 'len',
+                 'datablock', '_shouldCache', '_key', '_cachename')
+    __class   = "GopherObject"
+
     def __init__(self,
                  typecode = None,
                  host     = None,
@@ -34,8 +39,8 @@ class GopherObject:
                  locator  = None,
                  name     = None,
                  len      = -2):
-        self.__class      = "GopherObject"
         self._shouldCache = "YES"
+        self.forgetKey()
         self.setTypeCode(typecode)
         self.setHost(host)
         self.setPort(port)
@@ -68,6 +73,12 @@ class GopherObject:
         return self.len
     def getTypeCode(self):
         return self.type[0]
+    def isBinaryType(self):
+        """Returns true if data of this type is binary and should never be
+        decoded as text.  See binary_types in the gopher module."""
+        if not self.type:
+            return None
+        return self.getTypeCode() in binary_types
     def setDataBlock(self, block):
         self.datablock = block
         return self.datablock
@@ -77,6 +88,7 @@ class GopherObject:
         return self.setTypeCode(newtype)
     def setTypeCode(self, newtype):
         self.type = newtype
+        self.forgetKey()
         return self.type
     def getType(self):
         """Return a string representing the type code of the response.  See
@@ -88,17 +100,23 @@ class GopherObject:
     def getHost(self):
         return self.host
     def setHost(self, newhost):
+        if isinstance(newhost, str):
+            # The same few hosts show up over and over again.
+            newhost = sys.intern(newhost)
         self.host = newhost
+        self.forgetKey()
         return self.host
     def getPort(self):
         return self.port
     def setPort(self, newport):
-        self.port = newport
+        self.port = toPort(newport)
+        self.forgetKey()
         return self.port
     def getLocator(self):
         return self.locator
     def setLocator(self, newlocator):
         self.locator = newlocator
+        self.forgetKey()
         return self.locator
     def getName(self):
         if self.name.strip() == '/':
@@ -114,13 +132,34 @@ class GopherObject:
     def setName(self, newname):
         self.name = newname
         return self.name
+    def getKey(self):
+        """Returns the canonical key of this object: a (host, port, type
+        code, locator) tuple, with the host lowercased.  Objects with equal
+        keys are the same thing on the same server, so this is what caches
+        and tables of requests go by.  It's worked out once, and forgotten
+        when any of those fields change."""
+        if self._key is None:
+            host = self.host
+            if isinstance(host, str):
+                host = host.lower()
+
+            typecode = None
+            if self.type:
+                typecode = self.getTypeCode()
+
+            self._key = (host, self.port, typecode, self.locator)
+        return self._key
+    def forgetKey(self):
+        self._key       = None
+        self._cachename = None
+        return None
     # Methods
     def toURL(self):
         """Return the URL form of this GopherResource"""
         return "gopher://%s:%s/%s%s" % (self.getHost(),
                                         self.getPort(),
                                         self.getTypeCode(),
-                                        re.sub("\t", "%9;", self.getLocator()))
+                                        self.getLocator().replace("\t", "%9;"))
     def toProtocolString(self):
         """Returns the protocol string, i.e. how it would have been served
         by the server, in a string."""
@@ -156,63 +195,94 @@ class GopherObject:
 
     def filenameToURL(self, filename):
         """Unencodes filenames returned by toFilename() into URLs"""        
-        try:
-            return utils.character_replace(filename, os.sep, "/")
-        except:
-            # os.sep is '/' - character_replace doesn't allow replacing a
-            # character with itself.  we're running Eunuchs.
-            return filename
+        return filename.replace(os.sep, "/")
 
     def toCacheFilename(self):
-        filename = self.toFilename()
-        lastchr = filename[len(filename)-1]
-        if lastchr == os.sep or lastchr == '/':
-            # Pray for no name clashes...  :)
-            # We have to call it something inside the leaf directory, because
-            # if you don't, you get into the problem of caching responses from
-            # directories as files, and not having a directory to put the items
-            # in the directory in.  And you can't call the file "" on any
-            # filesystem.  :)
-            filename = "%sgopherdir.idx" % filename
-        elif self.getTypeCode() == RESPONSE_DIR:
-            filename = "%s%sgopherdir.idx" % (filename, os.sep)
-
-        port = self.getPort()
-        str_to_find = ":%d" % int(port)
-
-        # Cut out the port portion of the filename.  This is because some
-        # OS's throw up with ':' in filenames.  Bummer, but this will make it
-        # hard to translate a filename/path -> URL
-        ind = filename.find(str_to_find)
-        if ind != -1:
-            filename = "%s%s" % (filename[0:ind],
-                                 filename[ind+len(str_to_find):])
-
-        if os.sep == '\\':       # No-name mac wannabe OS's... :)
-            for char in ['/', ':', ';', '%', '*', '|']:
-                # This isn't necessarily a good idea, but it's somewhat
-                # necessary for windows boxen.
-                filename = utils.character_replace(filename, char, ' ')
-            
-        return filename
+        """Returns the name of the file this object is cached in, relative
+        to the cache directory.  See keyToCacheFilename()"""
+        if self._cachename is None:
+            self._cachename = keyToCacheFilename(self.getKey())
+        return self._cachename
 
     def toFilename(self):
         """Returns the name of a unique file containing the elements of this
         object.  This file is not guaranteed to not exist, but it probably
         doesn't. :)  Get rid of all of the slashes, since they are
         Frowned Upon (TM) by most filesystems."""
-
-        replaceables = ['\t', '\n', '\\', '/']
         data = self.toURL()
 
         if data.lower().lstrip().find("gopher://") == 0:
             # Chomp the "gopher://" part
             data = data[len("gopher://"):]
-        
-        for r in replaceables:
-            try:
-                data = utils.character_replace(data, r, os.sep)
-            except:
-                pass
-
-        return data
+
+        return data.translate(FILENAME_CHARS)
+
+# Characters that can't be used as they are in filenames, and what they
+# are turned into.
+FILENAME_CHARS = str.maketrans({'\t': os.sep, '\n': os.sep, '\\': os.sep,
+                                '/': os.sep})
+CACHE_CHARS    = FILENAME_CHARS
+
+if os.sep == '\\':       # No-name mac wannabe OS's... :)
+    # This isn't necessarily a good idea, but it's somewhat necessary for
+    # windows boxen.
+    CACHE_CHARS = dict(FILENAME_CHARS)
+    CACHE_CHARS.update(str.maketrans(":;%*|", "     "))
+
+# What the file holding a directory is called.
+DIRECTORY_FILENAME = "gopherdir.idx"
+
+def keyToCacheFilename(key):
+    """Returns the cache filename, relative to the cache directory, of the
+    object with canonical key key.  The host is the top directory, with the
+    port tacked on with a _ unless it's 70; some OS's throw up with ':' in
+    filenames.  Then the type code, then the locator.  Directories are
+    stored as a file inside the leaf directory, so that the items in the
+    directory have somewhere to go.  See cacheFilenameToKey()"""
+    (host, port, typecode, locator) = key
+
+    if port == 70:
+        hostpart = "%s" % host
+    else:
+        hostpart = "%s_%s" % (host, port)
+
+    filename = ("%s/%s%s" % (hostpart, typecode, locator or "")).translate(
+        CACHE_CHARS)
+
+    if filename.endswith(os.sep):
+        # Pray for no name clashes...  :)
+        # You can't call the file "" on any filesystem.  :)
+        filename = filename + DIRECTORY_FILENAME
+    elif typecode == RESPONSE_DIR:
+        filename = filename + os.sep + DIRECTORY_FILENAME
+
+    return filename
+
+def cacheFilenameToKey(filename):
+    """Returns the canonical key of the object cached in filename, one of
+    the names keyToCacheFilename() returns.  Characters that can't be in
+    filenames can't be gotten back, so those locators come back with
+    slashes in their place.  Hosts can have _'s in them too, so only a
+    port number keyToCacheFilename() could have tacked on is split off."""
+    if filename.endswith(os.sep + DIRECTORY_FILENAME):
+        filename = filename[0:-len(os.sep + DIRECTORY_FILENAME)]
+
+    (hostpart, sep, rest) = filename.lstrip(os.sep).partition(os.sep)
+    (host, sep, port)     = hostpart.rpartition("_")
+
+    if not sep or not port.isdecimal() or int(port) == 70:
+        (host, port) = (hostpart, 70)
+
+    return (host, toPort(port), rest[0:1] or None,
+            rest[1:].replace(os.sep, "/"))
+
+def toPort(port):
+    """Returns port as an integer.  None stays None, and ports that aren't
+    numbers at all get the default gopher port."""
+    if port is None:
+        return port
+
+    try:
+        return int(port)
+    except ValueError:
+        return 70
@@ -20,25 +20,27 @@
 #  along with this program; if not, write to the Free Software
 #  Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
 #############################################################################
+import sys
 from urllib.parse import *
 from gopher import *
-import GopherConnection
 import GopherObject
+import InfoCache
 # import Options
 
 
 class GopherResource(GopherObject.GopherObject):
     verbose = None
     debugging = None  # Set to true for messages at the prompt, etc.
+    __slots__ = ('info', 'auxFields')
+    __class   = "GopherResource"
 
     def __init__(self, type=RESPONSE_DIR, host="gopher.floodgap.com", port=70, locator="/", stringName = "", auxFields=None):
         GopherObject.GopherObject.__init__(self, type, host, port, locator, stringName)
-        self.__class = "GopherResource"
         if self.debugging:
             print("NEW GOPHER RESOURCE: " + self.toString())
         self.info = None
         if not auxFields:
-            auxFields = []
+            auxFields = ()     # Shared by everything that has none
         self.setAuxFields(auxFields)
 
     def setInfo(self, newinfo):
@@ -48,9 +50,18 @@ class GopherResource(GopherObject.GopherObject):
     def getInfo(self, shouldFetch=None):
         """Returns the ResourceInformation block associated with this
         Resource.  If shouldFetch is true, the resource block will fetch
-        information about itself if none is present."""
+        information about itself if none is present.  Blocks that were
+        already fetched for the same URL are reused."""
+        if not self.info:
+            self.info = InfoCache.memo.get(self)
+
         if not self.info and shouldFetch:
+            # Not imported at the top: GopherConnection needs this module
+            # loaded first, and Options, Cache and the rest are imported
+            # from both.
+            import GopherConnection
             try:
+                conn = GopherConnection.GopherConnection()
                 self.setInfo(conn.getInfo(self))
             except Exception as errstr:
                 print("**** GopherResource couldn't get info about itself:")
@@ -61,21 +72,10 @@ class GopherResource(GopherObject.GopherObject):
         return self.info
     
     def setAuxFields(self, fields):
+        # ASK items need their information block before they can be shown,
+        # but it's not fetched here: that would cost a round trip per item
+        # while a menu is being parsed.  See getInfo(shouldFetch=1)
         self.auxFields = fields
-
-        if len(self.auxFields) > 0 and self.auxFields[0] == '?':
-            # We need to fetch information about this one, since it's
-            # going to contain ASK blocks.
-            conn = GopherConnection.GopherConnection()
-            
-            try:
-                self.setInfo(conn.getInfo(self))
-            except Exception as errstr:
-                print("**** GopherResource couldn't get info about itself:")
-                print(errstr)
-                # This is bad.
-                self.setInfo(None)
-        
         return self.auxFields
     
     def getAuxFields(self):
@@ -181,3 +181,23 @@ def URLtoResource(URL):
     res = GopherResource()
     return res.setURL(URL)
 
+def makeResource(type, host, port, locator, name, auxFields):
+    """Non-class method returning the same thing as
+    GopherResource(type, host, port, locator, name, auxFields), without
+    going through the chain of setters in the constructors.  Directory
+    parsers make thousands of these, so it adds up."""
+    res = GopherResource.__new__(GopherResource)
+    res.type         = type
+    res.host         = sys.intern(host)
+    res.port         = GopherObject.toPort(port)
+    res.locator      = locator
+    res.name         = name
+    res.len          = -2
+    res.datablock    = ""
+    res._shouldCache = "YES"
+    res.info         = None
+    res._key         = None
+    res._cachename   = None
+    res.auxFields    = auxFields or ()
+    return res
+
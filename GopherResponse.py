@@ -23,15 +23,16 @@
 #  along with this program; if not, write to the Free Software
 #  Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
 ##############################################################################
+import os
 import re
 from urllib.parse import *
 from gopher import *
 import Connection
-import GopherConnection
 import GopherObject
-import GopherResource
+import MenuStore
+import Sniffer
 import ResourceInformation
-import Options
+import utils
 
 class GopherException(Exception):
     pass
@@ -48,27 +49,32 @@ class GopherResponseException(Exception):
 
 class GopherResponse(GopherObject.GopherObject):
     verbose = None
+    MENU_CONFIDENCE = 0.9   # How sure looksLikeDir() has to be
 
     def __init__(self, type=None, host=None, port=None, loc=None, name=None):
         GopherObject.GopherObject.__init__(self, type, host, port, loc, name)
         self.__class = "GopherResponse"
         self.data = None
-        self.responses = []
+        self.datafile = None
+        self.responses = MenuStore.MenuStore()
+        self.verdict   = None    # [data, what it looks like]  See sniff()
 
     def toProtocolString(self):
         if self.getData() is None:
-            return "".join(list(map(lambda x: x.toProtocolString(), self.getResponses())))
+            return self.getResponses().toProtocolString()
         else:
             return self.getData()
 
     def writeToFile(self, filename):
         """Writes the contents of this response to a disk file at filename
         this may raise IOError which the caller should deal with"""
-        fp = open(filename, "w")
+        if self.getData() is not None and not isinstance(self.getData(), str):
+            fp = open(filename, "wb")   # Binary data, keep it as bytes.
+        else:
+            fp = open(filename, "w")
         
         if self.getData() == None:
-            for resp in self.getResponses():
-                fp.write(resp.toProtocolString())
+            fp.write(self.getResponses().toProtocolString())
         else:
             fp.write(self.getData())
 
@@ -77,27 +83,75 @@ class GopherResponse(GopherObject.GopherObject):
         return filename
 
     def getResponses(self):
-        """Return a list of responses.  This is only really good when the
+        """Return the responses, as a MenuStore that can be used like a list
+        of GopherResource objects.  This is only really good when the
         response was a directory and set of entries."""
         if self.getData() != None:
             raise GopherResponseException("Get data instead.")
         return self.responses
 
+    def setResponses(self, responses):
+        """Make responses, a MenuStore, the entries of this directory"""
+        self.responses = responses
+        return self.responses
+
+    def toBinary(self):
+        """Returns the entries of this directory as bytes that setBinary()
+        can load without parsing them again.  See MenuStore.toBinary()"""
+        return self.getResponses().toBinary()
+
+    def setBinary(self, data):
+        """Makes the entries in data, which toBinary() made, the entries of
+        this directory.  Returns None and changes nothing if data isn't in
+        that form at all.  Throws GopherResponseException if it is, but it
+        can't be loaded."""
+        if not MenuStore.isBinary(data):
+            return None
+
+        store = MenuStore.MenuStore()
+        try:
+            store.setBinary(data)
+        except MenuStore.MenuStoreException as errstr:
+            raise GopherResponseException("%s" % errstr)
+
+        self.setData(None)
+        self.setType(RESPONSE_DIR)
+        self.setResponses(store)
+        return 1
+
     def getData(self):
         """Return the data associated with the response.  This is usually all
-        of the data off of the socket except the trailing closer."""
+        of the data off of the socket except the trailing closer.  If the
+        data lives in a file, a memory mapped view of the file is returned."""
+        if self.data is None and self.datafile is not None:
+            self.data = utils.map_file(self.datafile)
         return self.data
 
+    def getDataFile(self):
+        """Return the name of the file holding the data of this response, or
+        None if the data is only in memory."""
+        return self.datafile
+
+    def setDataFile(self, filename):
+        """Make the data of this response the contents of filename.  The
+        file isn't read until the data is asked for."""
+        self.datafile = filename
+        self.data = None
+        self.verdict = None
+        return self.datafile
+
     def getDataLength(self):
-        return len(self.data)
+        if self.data is None and self.datafile is not None:
+            return os.stat(self.datafile).st_size
+        return len(self.getData())
 
     def getDataChunk(self, startIndex, endIndex=-1):
         """This method provides a way to get chunks of data at a time,
         rather than snarfing the entire ball."""
         
         if endIndex == -1:
-            endIndex = len(self.data)
-        return self.data[startIndex, endIndex]
+            endIndex = self.getDataLength()
+        return self.getData()[startIndex:endIndex]
 
     def getError(self):
         """If there was an error message, return it."""
@@ -115,56 +169,45 @@ class GopherResponse(GopherObject.GopherObject):
         """Modify the data within the response.  You probably don't want to
         do this."""
         self.data = data
+        self.datafile = None
+
+        if self.verdict is not None and self.verdict[0] is not data:
+            self.verdict = None
         return None
 
-    def looksLikeDir(self, data):
-        """Takes a chunk of data and returns true if it looks like directory
-        data, and false otherwise.  This is tricky, and is of course not 100%.
-        Basically, we look at each line, see if the first bit in the line is a
-        legal type, check to see that the line has at least 3 tabs in it.  If
-        all of the first 20 lines of the data follow that rule, then it's good
-        enough to be used as directory data.  If not, it gets chucked.  Notice
-        that if this really is a directory but it's using file types we've
-        never heard of (see gopher.py) then it will still get thrown out.
-        Bummer.  This should only be called anyway if the type indictator is
-        incorrect, so cope.  :)"""
-        
-        def linefn(l):
-            return l.replace("\r", "")
-
-        # Some very strange non-standards compliant servers send \r on some
-        # lines and not on others.  So split by newline and remove all
-        # carriage returns as they occur.
-        lines = list(map(linefn, data.split("\n", 10)))
-
-        for line in lines:
-            d = line.strip()
-            if not d or d == '' or d == '.':
-                continue
-            
-            if line.count("\t") < 2:
-                return None               # Not enough tabs.  Bummer.
-
-            isResponse = None
-            byte = line[0]
-            try:
-                resp = responses[byte]
-                isRespose = 1
-            except:
-                pass
-
-            if isResponse:
-                continue
-            
-            try:
-                resp = errors[byte]
-            except:
-                return None
-
-        if len(lines) > 0:
-            return 1     # Matched all tests for max 20 lines.  Looks OK.
-        else:
-            return 0     # Empty data isn't a directory.
+    def sniff(self, data=None):
+        """Returns [kind, confidence] telling what data, by default the data
+        of this response, looks like.  See Sniffer.  The verdict is
+        remembered, so asking again about the same data costs nothing."""
+        if data is None:
+            data = self.getData()
+
+        if self.verdict is None or self.verdict[0] is not data:
+            self.verdict = [data, Sniffer.sniffer.sniff(data)]
+        return self.verdict[1]
+
+    def looksLikeDir(self, data=None):
+        """Takes a chunk of data, by default the data of this response, and
+        returns true if it looks like directory data, and false otherwise.
+        This is tricky, and is of course not 100%.  Only the first few lines
+        are looked at; if nearly all of them start with a legal type and
+        have enough tabs, then it's good enough to be used as directory
+        data.  Notice that if this really is a directory but it's using file
+        types we've never heard of (see gopher.py) then it will still get
+        thrown out.  Bummer.  This should only be called anyway if the type
+        indictator is incorrect, so cope.  :)"""
+        if data is None:
+            data = self.getData()
+
+        if not isinstance(data, str):
+            # Binary data is kept as bytes and is never directory data.
+            return None
+
+        [kind, confidence] = self.sniff(data)
+
+        if kind == Sniffer.MENU and confidence >= self.MENU_CONFIDENCE:
+            return 1
+        return None
     
     def parseResponse(self, data):
         """Takes a lump of data, and tries to parse it as if it was a directory
@@ -172,7 +215,7 @@ class GopherResponse(GopherObject.GopherObject):
         result was good, so that you can use self.getRepsonses() to access
         them.  Otherwise it raises GopherResponseException"""
         
-        self.responses = []
+        self.responses = MenuStore.MenuStore()
 
         if self.type == RESPONSE_DIR:
             pass          # Keep going
@@ -181,70 +224,6 @@ class GopherResponse(GopherObject.GopherObject):
         else:
             raise GopherException("This isn't a directory.")
 
-        def stripCR(dat):
-            return dat.replace("\r", "")
-
-        # This is done because \r may or may not be present, so we can't
-        # split by \r\n because it fails for some misbehaved gopher servers.
-        self.lines = list(map(stripCR, data.split("\n")))
-
-        for line in self.lines:
-            if len(line) <= 1:
-                continue
-
-            # Type of the resource.  See gopher.py for the possibilities.
-            stype = "%s" % line[0]
-            line = line[1:]
-
-            # Gopher protocol uses tab delimited fields...
-            linedata = line.split("\t")
-            name    = "Unknown"              # Silly defaults
-            locator = "Unknown"
-            host    = "Unknown"
-            port    = 70
-
-            try:
-                name = linedata[0]           # Assign the right things in the
-            except IndexError: pass          # right places (maybe)
-            try:                             # Catch those errors coming from
-                locator = linedata[1]        # the line not being split into 
-            except IndexError: pass          # enough tokens.  Realistically,
-            try:                             # if those errors happen,
-                host = linedata[2]           # something is really screwed up
-            except IndexError: pass          # and there's not much we can do
-            try:                             # anyway.  
-                port = linedata[3]
-            except IndexError: pass
-
-            try:
-                remainder = linedata[4:]     # Extra Gopher+ fields.
-            except:
-                remainder = []
-
-            # UMN gopherd errors do this sometimes.  It's quite annoying.
-            # they list the response type as 'directory' and then put the host
-            # as 'error.host' to flag errors
-            if host == 'error.host' and stype != RESPONSE_BLURB:
-                stype = RESPONSE_ERR
-
-            newresource = GopherResource.GopherResource(stype, host,
-                                                        port, locator, name,
-                                                        remainder)
-            
-            # Are the options set to allow us to get info?
-            # THIS SHOULD BE USED WITH CAUTION since it can slow things down
-            # more than you might think.
-            if Options.program_options.getOption('grab_resource_info'):
-                if len(remainder) >= 1 and remainder[0] == '+':
-                    try:
-                        conn = GopherConnection.GopherConnection()
-                        info = conn.getInfo(newresource)
-                        newresource.setInfo(info)
-                    except GopherConnectionException as estr:
-                        print("***(GCE) can't get info: %s" % estr)
-                    except Exception as estr:
-                        print("***(unknown) Couldn't %s %s" % (Exception,estr))
-
-            self.responses.append(newresource)
+        self.responses = MenuStore.MenuStore(data)
         return None
 # End GopherResponse
@@ -0,0 +1,81 @@
+# Copyright (C) 2001 David Allen <mda@idatar.com>
+# Copyright (C) 2020 Tom4hawk
+#
+# Released under the terms of the GNU General Public License
+#
+# Remembers the Gopher+ information blocks fetched for resources, so that
+# each one is asked for only once no matter how many GopherResource objects
+# point at it.  Entries are keyed by canonical key, and the least recently used ones
+# are dropped once there are too many.
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#############################################################################
+import threading
+from collections import OrderedDict
+
+
+class InfoCache:
+    verbose = None
+    SIZE    = 2048    # Most information blocks remembered at once
+
+    def __init__(self):
+        self.lock    = threading.Lock()
+        self.entries = OrderedDict()
+
+    def getKey(self, resource):
+        return resource.getKey()
+
+    def get(self, resource):
+        """Returns the ResourceInformation remembered for resource, or None"""
+        key = self.getKey(resource)
+
+        with self.lock:
+            info = self.entries.get(key)
+            if info is not None:
+                self.entries.move_to_end(key)
+        return info
+
+    def set(self, resource, info):
+        """Remembers info as the information block of resource"""
+        if info is None:
+            return info
+
+        key = self.getKey(resource)
+
+        with self.lock:
+            self.entries[key] = info
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.SIZE:
+                self.entries.popitem(last=False)
+        return info
+
+    def forget(self, resource):
+        with self.lock:
+            self.entries.pop(self.getKey(resource), None)
+        return None
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+        return None
+
+    def countEntries(self):
+        with self.lock:
+            return len(self.entries)
+
+
+# One memo for the whole program.
+memo = InfoCache()
@@ -0,0 +1,165 @@
+# Copyright (C) 2001 David Allen <mda@idatar.com>
+# Copyright (C) 2020 Tom4hawk
+#
+# Released under the terms of the GNU General Public License
+#
+# Cuts the rows of a directory into fields.  MenuStore keeps the rows and
+# calls splitRow() for each one the first time a resource is made out of
+# it.  Lines that are short on fields get defaults instead of raising
+# exceptions.
+#
+# MenuSink parses a directory into a MenuStore while it's coming off of
+# the socket, so that it can be shown before the last of it arrives.
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#############################################################################
+import time
+import codecs
+import Sink
+import MenuStore
+from gopher import *
+
+
+class MenuParser:
+    verbose = None
+
+    # Fields of a line in the order the server sends them, after the type
+    # code.  Anything past PORT is Gopher+ stuff.
+    NAME    = 0
+    LOCATOR = 1
+    HOST    = 2
+    PORT    = 3
+    AUX     = 4
+
+    # Used for fields missing from a line.  (Silly defaults)
+    DEFAULTS = ["Unknown", "Unknown", "Unknown", 70]
+
+    def splitRow(self, row):
+        """Returns the fields of row, one menu line without its line
+        ending: the type code, then name, locator, host and port, and the Gopher+
+        fields as a list.  Missing fields get defaults."""
+        fields = row[1:].split("\t", self.AUX)
+
+        if len(fields) < self.AUX:
+            fields.extend(self.DEFAULTS[len(fields):])
+
+        if len(fields) > self.AUX:
+            aux = fields[self.AUX].split("\t")
+        else:
+            aux = []
+
+        stype = row[0]
+
+        if fields[self.HOST] == 'error.host' and stype != RESPONSE_BLURB:
+            # UMN gopherd errors do this sometimes.  It's quite annoying.
+            # they list the response type as 'directory' and then put the
+            # host as 'error.host' to flag errors
+            stype = RESPONSE_ERR
+
+        return [stype, fields[self.NAME], fields[self.LOCATOR],
+                fields[self.HOST], fields[self.PORT], aux]
+
+
+class MenuSink(Sink.MemorySink):
+    """A sink that parses directory data into a MenuStore as it arrives,
+    instead of keeping the raw data.  Each time new rows are in, but no
+    more often than every BATCH_INTERVAL seconds, callback is called with
+    the store, from the thread doing the reading.  Reading stops at the
+    line with the terminating . on it."""
+    BATCH_INTERVAL = 0.1
+
+    def __init__(self, callback=None):
+        Sink.MemorySink.__init__(self)
+        self.store    = MenuStore.MenuStore()
+        self.store.clear()
+        self.decoder  = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+        self.partial  = ""       # The start of a line that isn't all in yet
+        self.done     = None     # Seen the terminating .
+        self.callback = callback
+        self.reported = 0        # Rows in the store at the last callback
+        self.lastCall = 0
+
+    def write(self, chunk):
+        self.length = self.length + len(chunk)
+
+        if self.done:
+            return self.length
+
+        text = self.partial + self.decoder.decode(chunk)
+        end  = text.rfind("\n")
+
+        if end == -1:
+            self.partial = text
+        else:
+            self.partial = text[end+1:]
+            self.addLines(text[0:end+1])
+        return self.length
+
+    def addLines(self, text):
+        """Adds text, which is made of whole lines, to the store.  Stops at
+        the terminating . if it's in there."""
+        text = text.replace("\r", "")
+
+        if text[0:2] == ".\n":
+            end = 0
+        else:
+            end = text.find("\n.\n")
+            if end != -1:
+                end = end + 1
+
+        if end != -1:
+            text      = text[0:end]
+            self.done = 1
+
+        self.store.addText(text)
+        self.report()
+        return None
+
+    def report(self, force=None):
+        now = time.time()
+
+        if self.callback is None or len(self.store) == self.reported:
+            return None
+        if not force and now - self.lastCall < self.BATCH_INTERVAL:
+            return None
+
+        self.reported = len(self.store)
+        self.lastCall = now
+        self.callback(self.store)
+        return None
+
+    def close(self):
+        if not self.done:
+            # Servers that don't bother with the . or the last line ending
+            text = self.partial + self.decoder.decode(b"", True)
+            if text:
+                self.addLines(text + "\n")
+
+        self.partial = ""
+        self.store.setComplete(1)
+        self.report(1)
+        return None
+
+    def isComplete(self):
+        return self.done
+
+    def getStore(self):
+        return self.store
+
+    def getData(self):
+        return self.getText().encode()
+
+    def getText(self):
+        return self.store.toProtocolString()
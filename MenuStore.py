@@ -0,0 +1,425 @@
+# Copyright (C) 2001 David Allen <mda@idatar.com>
+# Copyright (C) 2020 Tom4hawk
+#
+# Released under the terms of the GNU General Public License
+#
+# Holds a parsed menu in columns instead of as a list of GopherResource
+# objects.  The directory data is kept as one string, and each row is just
+# its type code in a bytearray and where it starts and ends in that string,
+# in two array('I')s.  That's 9 bytes a row plus the text itself.
+#
+# The store acts like a read-only list of GopherResource objects.  A
+# resource is only made when its row is asked for, and is kept so that
+# the same row always gives back the same object.  Things that only need a
+# type code or a name (rendering blurbs, finding, filtering) can read the
+# columns directly and never make any.
+#
+# Menus can also be filled in a bit at a time as they come off the
+# network, with rows read from another thread while that goes on.
+#
+# The columns can be written out and read back in as they are, which is
+# how the cache stores menus.  See toBinary() for the format.
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#############################################################################
+import sys
+import zlib
+import bisect
+import struct
+import operator
+from array     import array
+from itertools import accumulate, compress
+
+import GopherResource
+import MenuParser
+import InfoCache
+from gopher import *
+
+# The binary form of a store: this header, then the type codes, starts and
+# ends columns, then the text in UTF-8.  Integers are little endian.  The
+# checksum is the CRC-32 of everything after the header.
+BINARY_MAGIC   = b"FORGMENU"
+BINARY_VERSION = 1
+BINARY_HEADER  = struct.Struct("<8sHHIII")  # magic, version, column width,
+                                            # rows, text bytes, checksum
+
+
+def isBinary(data):
+    """Returns true if data, bytes or the like, starts out like something
+    MenuStore.toBinary() made."""
+    return bytes(data[0:len(BINARY_MAGIC)]) == BINARY_MAGIC
+
+
+class MenuStoreException(Exception):
+    def __init__(self, message):
+        super(MenuStoreException, self).__init__(message)
+
+
+class MenuStore:
+    verbose = None
+    RESOURCE_SIZE = 400     # About what a made resource and its strings take
+
+    def __init__(self, data=None):
+        self.parser = MenuParser.MenuParser()
+        self.setData(data)
+        return None
+
+    def clear(self):
+        # The text the rows are in.  It's one string, except while rows are
+        # still being added with addText(), when it's one per call: the
+        # strings, and where each one starts as if they were all joined.
+        self.text     = ([], array('I'))
+        self.size     = 0
+        self.types    = bytearray()
+        self.starts   = array('I')
+        self.ends     = array('I')
+        self.made     = {}          # Row number -> GopherResource
+        self.infos    = {}          # URL -> block for rows not made yet
+        self.complete = None
+        return None
+
+    def setData(self, data):
+        """Cuts data, the text of a directory, into rows.  Empty lines and
+        the terminating . are skipped."""
+        self.clear()
+
+        if data:
+            # \r may or may not be present, so we can't split by \r\n
+            # because it fails for some misbehaved gopher servers.
+            self.addText(data.replace("\r", ""))
+
+        self.setComplete(1)
+        return None
+
+    def addText(self, text):
+        """Adds the rows in text, which has had its \r's taken out and
+        should end at the end of a line.  This is how menus are filled in
+        while they're still arriving; see MenuParser.MenuSink.  Rows that
+        are already there can be read from another thread meanwhile."""
+        base = self.size
+
+        # Everything below runs in C; there's no per-line python code.
+        lines   = text.split("\n")
+        lengths = list(map(len, lines))
+        keep    = list(map((1).__lt__, lengths))
+        offsets = accumulate(map((1).__add__, lengths), initial=base)
+
+        starts = array('I', compress(offsets, keep))
+        ends   = array('I', map(operator.add, starts,
+                                compress(lengths, keep)))
+        # Type codes that don't fit in a byte end up as '?' here, but the
+        # resources made out of the rows still get the real one.
+        types  = bytearray("".join(map(operator.itemgetter(0),
+                                       compress(lines, keep))),
+                           "latin-1", "replace")
+
+        # Readers go by len(self.starts), so everything a row needs has to
+        # be in place before its start is.
+        (pieces, bases) = self.text
+        pieces.append(text)
+        bases.append(base)
+        self.size = base + len(text)
+        self.types.extend(types)
+        self.ends.extend(ends)
+        self.starts.extend(starts)
+        return len(starts)
+
+    def toBinary(self):
+        """Returns the store as bytes that setBinary() can read back in
+        without parsing anything.  Made resources aren't saved."""
+        text = self.getText()
+        if text is None:
+            text = "".join(self.text[0])
+
+        text   = text.encode("utf-8", "surrogatepass")
+        starts = self.starts
+        ends   = self.ends
+
+        if sys.byteorder != "little":
+            starts = array('I', starts)
+            ends   = array('I', ends)
+            starts.byteswap()
+            ends.byteswap()
+
+        parts = [bytes(self.types), starts.tobytes(), ends.tobytes(), text]
+        crc   = 0
+        for part in parts:
+            crc = zlib.crc32(part, crc)
+
+        header = BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION,
+                                    starts.itemsize, len(starts), len(text),
+                                    crc)
+        return b"".join([header] + parts)
+
+    def setBinary(self, data):
+        """Replaces the rows with the ones in data, which toBinary() made.
+        Throws MenuStoreException if data was made by another version, or
+        has been damaged."""
+        view  = memoryview(data)
+        width = self.starts.itemsize
+
+        if len(view) < BINARY_HEADER.size:
+            raise MenuStoreException("Menu data is cut short")
+
+        [magic, version, itemsize, rows, length, crc] = \
+                BINARY_HEADER.unpack_from(view)
+
+        if magic != BINARY_MAGIC:
+            raise MenuStoreException("Not menu data")
+        if version != BINARY_VERSION or itemsize != width:
+            raise MenuStoreException("Menu data is version %d/%d, not %d/%d"
+                                     % (version, itemsize, BINARY_VERSION,
+                                        width))
+
+        body = view[BINARY_HEADER.size:]
+        if len(body) != rows * (1 + 2 * width) + length:
+            raise MenuStoreException("Menu data is the wrong size")
+        if zlib.crc32(body) != crc:
+            raise MenuStoreException("Menu data is damaged")
+
+        self.clear()
+
+        types  = bytearray(body[0:rows])
+        starts = array('I')
+        ends   = array('I')
+        starts.frombytes(body[rows:rows + rows * width])
+        ends.frombytes(body[rows + rows * width:rows + 2 * rows * width])
+
+        if sys.byteorder != "little":
+            starts.byteswap()
+            ends.byteswap()
+
+        text = str(body[rows + 2 * rows * width:], "utf-8", "surrogatepass")
+
+        self.text   = ([text], array('I', [0]))
+        self.size   = len(text)
+        self.types  = types
+        self.ends   = ends
+        self.starts = starts
+        self.setComplete(1)
+        return None
+
+    def setComplete(self, complete):
+        """Marks whether all of the rows are in"""
+        self.complete = complete
+        return self.complete
+
+    def isComplete(self):
+        return self.complete
+
+    def getText(self):
+        """Returns the string all of the rows are in, or None if it's still
+        in pieces because rows are still arriving."""
+        (pieces, bases) = self.text
+
+        if len(pieces) > 1 and self.complete:
+            # Nothing is added anymore, so put the pieces together for good.
+            self.text = (["".join(pieces)], array('I', [0]))
+            (pieces, bases) = self.text
+
+        if len(pieces) == 1:
+            return pieces[0]
+        elif not pieces:
+            return ""
+        return None
+
+    # The list interface
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[x] for x in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index = index + len(self)
+
+        res = self.made.get(index)
+        if res is None:
+            res = self.makeResource(index)
+        return res
+
+    def __iter__(self):
+        for x in range(len(self)):
+            yield self[x]
+
+    def makeResource(self, index):
+        """Makes the GopherResource for row number index, and keeps it."""
+        [stype, name, locator, host, port, aux] = \
+                self.parser.splitRow(self.getRow(index))
+        res = GopherResource.makeResource(stype, host, port, locator, name,
+                                          aux)
+        res = self.made.setdefault(index, res)
+
+        if self.infos:
+            self.attachInfo(res)
+        return res
+
+    def setInfos(self, infos):
+        """Hands the store information blocks for its rows: infos maps the
+        URL of a row's resource to its ResourceInformation.  Each one is
+        attached when its row is made into a resource, so rows nobody looks
+        at cost nothing.  Rows that are already made get theirs now."""
+        self.infos = dict(infos)
+
+        for res in list(self.made.values()):
+            self.attachInfo(res)
+        return None
+
+    def getInfos(self):
+        """Returns the blocks from setInfos() whose rows haven't been made
+        into resources yet, by URL."""
+        return self.infos
+
+    def attachInfo(self, res):
+        info = self.infos.pop(res.toURL(), None)
+
+        if info is not None and res.getInfo() is None:
+            res.setInfo(InfoCache.memo.set(res, info))
+        return None
+
+    def countMade(self):
+        """Returns how many rows have been made into resources so far."""
+        return len(self.made)
+
+    def getMade(self):
+        """Returns the resources made so far, in row order."""
+        return [self.made[x] for x in sorted(self.made.keys())]
+
+    def getMemorySize(self):
+        """Returns about how many bytes the store takes up, counting the
+        resources made so far."""
+        (pieces, bases) = self.text
+        size = sum(map(sys.getsizeof, pieces))
+        size = size + len(self.types) + self.starts.itemsize * len(self.starts)
+        size = size + self.ends.itemsize * len(self.ends)
+        return size + self.RESOURCE_SIZE * len(self.made)
+
+    # Reading the columns
+    def getRow(self, index):
+        """Returns row number index as the server sent it, without the line
+        ending.  Raises IndexError."""
+        start = self.starts[index]
+        (pieces, bases) = self.text
+
+        if len(pieces) == 1:
+            return pieces[0][start:self.ends[index]]
+
+        piece = bisect.bisect_right(bases, start) - 1
+        base  = bases[piece]
+        return pieces[piece][start - base:self.ends[index] - base]
+
+    def getTypeCode(self, index):
+        """Returns the type code of row number index as the server sent it.
+        Unlike the resource's, this isn't turned into RESPONSE_ERR for
+        error.host rows."""
+        return chr(self.types[index])
+
+    def getName(self, index):
+        """Returns the name field of row number index as the server sent
+        it, without making a resource."""
+        return self.getRow(index)[1:].partition("\t")[0]
+
+    def indexesOfType(self, typecode):
+        """Returns the numbers of the rows of type typecode, in order"""
+        code    = ord(typecode)
+        types   = self.types
+        indexes = []
+        index   = types.find(code)
+
+        while index != -1:
+            indexes.append(index)
+            index = types.find(code, index + 1)
+        return indexes
+
+    def find(self, term, start=0, caseSensitive=None):
+        """Returns the number of the first row at or after start with term
+        in its name, or -1 if there isn't one."""
+        buffer = self.getText()
+        if buffer is None or (not caseSensitive and not buffer.isascii()):
+            # Still in pieces, or lowercasing might move things around so
+            # the offsets wouldn't match anymore.  Do it the slow way.
+            if not caseSensitive:
+                term = term.lower()
+            for index in range(start, len(self)):
+                name = self.getName(index)
+                if not caseSensitive:
+                    name = name.lower()
+                if name.find(term) != -1:
+                    return index
+            return -1
+
+        if not caseSensitive:
+            buffer = buffer.lower()
+            term   = term.lower()
+
+        starts = self.starts
+        ends   = self.ends
+        pos    = starts[start] if start < len(starts) else len(buffer)
+
+        while 1:
+            pos = buffer.find(term, pos)
+            if pos == -1:
+                return -1
+
+            # Which row is it in, and is it in that row's name?
+            index = self.rowAt(pos, start)
+            if index == -1:
+                return -1
+
+            nameEnd = buffer.find("\t", starts[index], ends[index])
+            if nameEnd == -1:
+                nameEnd = ends[index]
+
+            if pos > starts[index] and pos + len(term) <= nameEnd:
+                return index
+            elif pos <= starts[index]:
+                pos = starts[index] + 1   # Matched the type code, keep going
+            else:
+                pos = ends[index] + 1     # Not in this row's name
+
+            start = index
+
+    def rowAt(self, pos, lo=0):
+        """Returns the number of the row containing offset pos of the
+        buffer, or -1 if pos is past the last row."""
+        starts = self.starts
+        hi     = len(starts)
+
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if starts[mid] <= pos:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        index = lo - 1
+        if index < 0 or pos > self.ends[index]:
+            # Between rows, i.e. on a skipped line.  Go on to the next one.
+            if lo < len(starts):
+                return lo
+            return -1
+        return index
+
+    def toProtocolString(self):
+        """Returns the rows the way the server sent them"""
+        buffer = self.getText()
+        if buffer is None:
+            rows = [self.getRow(x) for x in range(len(self))]
+        else:
+            rows = [buffer[s:e] for s, e in zip(self.starts, self.ends)]
+        if not rows:
+            return ""
+        return "\r\n".join(rows) + "\r\n"
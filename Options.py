@@ -24,15 +24,16 @@
 import os
 import Cache
 import Associations
+import DNSCache
+import ResponseCache
 
 class Options:
     def __init__(self, *args):
         # Default values for some important options...
-        self.ip_cache = {}
+        self.dns_cache = DNSCache.DNSCache()
         self.cache = Cache.Cache()
         self.associations = Associations.Associations()
         self.setDefaultOpts()
-        self.greenLight()
 
     # Accessors/Mutators
     
@@ -50,12 +51,20 @@ class Options:
         self.associations = newassoc
         return self.getAssociations()
 
+    def getDNSCache(self):
+        return self.dns_cache
+
+    def setDNSCache(self, newcache):
+        self.dns_cache = newcache
+        return self.getDNSCache()
+
     def getIP(self, hostname):
-        """Return the cached IP of hostname.  May throw KeyError"""
-        return self.ip_cache[hostname]
+        """Return the cached IP of hostname.  May throw KeyError, or
+        DNSCacheException if hostname recently couldn't be found."""
+        return self.dns_cache.get(hostname)[0]
     
     def setIP(self, hostname, IP):
-        self.ip_cache[hostname] = IP
+        self.dns_cache.set(hostname, [IP])
         return self.getIP(hostname)
 
     def save(self, alternate_filename=None):
@@ -90,16 +99,6 @@ class Options:
             self.opts[key] = 1
         return self.opts[key]
             
-    def greenLight(self):
-        """Set the green light.  This is used for thread synchronization"""
-        self.GREEN_LIGHT = 1
-        return self.GREEN_LIGHT
-    
-    def redLight(self):
-        """Turn off the green light.  For thread synchronization."""
-        self.GREEN_LIGHT = None
-        return self.GREEN_LIGHT
-    
     def __get_xdg_path(self, variable: str) -> str:
         """ Returns path to XDG_CONFIG_HOME, XDG_CACHE_HOME and XDG_DATA_HOME according to XDG Base spec"""
         xdg_vars = {
@@ -148,6 +147,47 @@ class Options:
         self.opts['display_info_in_directories'] = None
         self.opts['use_PIL']                     = 1  # Use PIL for images
 
+        # Binary documents larger than this many bytes are written to disk
+        # as they arrive instead of being held in memory.
+        self.opts['spill_threshold']             = 1024 * 1024
+
+        # Timeouts in seconds: for connecting, for the server to start
+        # answering, and for the server to go quiet in the middle of a
+        # transfer.
+        self.opts['connect_timeout']             = 20
+        self.opts['first_byte_timeout']          = 60
+        self.opts['idle_timeout']                = 60
+
+        # How long in seconds hostname lookups are remembered, and how long
+        # hosts that couldn't be found are.
+        self.opts['dns_ttl']                     = DNSCache.DNSCache.TTL
+        self.opts['dns_negative_ttl']            = DNSCache.DNSCache.NEGATIVE_TTL
+
+        # Most information blocks fetched at once in the background once a
+        # directory is on the screen.
+        self.opts['prefetch_limit']              = 4
+
+        # Seconds information blocks saved with cached directories are good
+        # for.
+        self.opts['info_ttl']                    = 24 * 60 * 60
+
+        # Most the cache may hold, in bytes and in files.  Past either one,
+        # the least recently used files that aren't bookmarked are deleted.
+        # 0 means no limit, which is how the cache has always been; nothing
+        # is thrown out unless one is set.
+        self.opts['cache_max_bytes']             = 0
+        self.opts['cache_max_files']             = 0
+
+        # Most bytes of parsed responses kept in memory in front of the
+        # cache, so going back to a menu doesn't mean reading it again.
+        # 0 means none are.
+        self.opts['response_cache_bytes']        = ResponseCache.ResponseCache.BUDGET
+
+        # How cached text and menus are compressed: zlib, lzma or none.
+        # lzma packs tighter but takes longer.  Menus always use zlib, and
+        # binary types are never compressed.
+        self.opts['cache_compression']           = None
+
         self.opts['cache_prefix'] = "%s%s" % (self.opts['cache_directory'], os.sep)
 
     def makeToggleWrapper(self, keyname):
@@ -173,6 +213,15 @@ class Options:
         except KeyError:
             return None
         
+    def getIntOption(self, optionname, default=0):
+        """Get an option named optionname as an integer.  Options read from
+        disk are strings, so they are converted here.  Returns default if
+        the option is not set or isn't a number."""
+        try:
+            return int(self.getOption(optionname))
+        except (TypeError, ValueError):
+            return default
+
     def toString(self):
         """Returns string representation of the object."""
         return self.__str__()
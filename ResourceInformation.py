@@ -28,6 +28,7 @@ from tkinter import *
 import Pmw
 import os
 import re
+import time
 import ContentFrame
 from gopher         import *
 import GopherResource
@@ -37,6 +38,7 @@ class ResourceInformation:
     verbose = None
     def __init__(self, data=None):
         self.blockdict = {}
+        self.fetched   = time.time()   # When the blocks came from the server
 
         self.data = data
         
@@ -101,7 +103,7 @@ class ResourceInformation:
                 # strip the leading space.  This is because in gopher+
                 # when it responds to info queries, each response line that
                 # isn't a block header is indented by one space.
-                data = re.sub("\n ", "\n", lines[1:].join("\n"))
+                data = re.sub("\n ", "\n", "\n".join(lines[1:]))
 
                 # Get the first space in the data.
                 if self.verbose:
@@ -127,7 +129,7 @@ class ResourceInformation:
 
         if self.verbose:
             k = list(self.blockdict.keys())
-            print("Available block titles are:\n%s" % k.join("\n"))
+            print("Available block titles are:\n%s" % "\n".join(k))
 
         print("Keys are ", list(self.blockdict.keys()))
         return self
@@ -159,6 +161,13 @@ class ResourceInformation:
         return self.blockdict['info']
     def getAdmin(self):
         return self.blockdict['admin']
+    def getData(self):
+        return self.data
+    def getFetchTime(self):
+        return self.fetched
+    def setFetchTime(self, when):
+        self.fetched = when
+        return self.getFetchTime()
     def getBlockNames(self):
         return list(self.blockdict.keys())
     def getBlock(self, blockname):
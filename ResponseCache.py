@@ -0,0 +1,126 @@
+# Copyright (C) 2001 David Allen <mda@idatar.com>
+# Copyright (C) 2020 Tom4hawk
+#
+# Released under the terms of the GNU General Public License
+#
+# Remembers the GopherResponse objects most recently read from or written
+# to the disk cache, already parsed, so that going back to a menu that was
+# just up doesn't read and parse its file all over again.  Entries are
+# keyed by canonical key.  What they take up in memory is estimated, and
+# the least recently used ones are dropped once that's over budget.
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#############################################################################
+import sys
+import threading
+from collections import OrderedDict
+
+
+class ResponseCache:
+    verbose = None
+    BUDGET  = 32 * 1024 * 1024   # Most bytes of responses remembered at once
+
+    def __init__(self):
+        self.lock    = threading.Lock()
+        self.entries = OrderedDict()    # key -> [response, size]
+        self.size    = 0
+        self.budget  = self.BUDGET
+        self.hits    = 0
+        self.misses  = 0
+
+    def setBudget(self, budget):
+        """Sets the most bytes remembered at once.  0 turns this off."""
+        with self.lock:
+            self.budget = budget
+            self.shrink()
+        return self.budget
+
+    def getSize(self, resp):
+        """Returns about how many bytes resp takes up, or None if it
+        shouldn't be remembered.  Responses whose data is in a file are
+        cheap to get back anyway, and their files may be gone later."""
+        if resp.getDataFile() is not None:
+            return None
+
+        data = resp.getData()
+        if data is None:
+            return resp.getResponses().getMemorySize()
+        if isinstance(data, (str, bytes, bytearray)):
+            return sys.getsizeof(data)
+        return None
+
+    def get(self, resource):
+        """Returns the GopherResponse remembered for resource, or None"""
+        key = resource.getKey()
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses = self.misses + 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits = self.hits + 1
+        return entry[0]
+
+    def set(self, resource, resp):
+        """Remembers resp as what resource holds, if it's worth it"""
+        size = self.getSize(resp)
+        key  = resource.getKey()
+
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size = self.size - old[1]
+
+            if size is None or size > self.budget:
+                return resp
+
+            self.entries[key] = [resp, size]
+            self.size = self.size + size
+            self.shrink()
+        return resp
+
+    def shrink(self):
+        # Called with the lock held.
+        while self.entries and self.size > self.budget:
+            [key, [resp, size]] = self.entries.popitem(last=False)
+            self.size = self.size - size
+        return None
+
+    def isRemembered(self, resource, resp):
+        """Returns true if resp is the very response remembered for
+        resource, meaning it came from the cache or already went into it."""
+        with self.lock:
+            entry = self.entries.get(resource.getKey())
+            return entry is not None and entry[0] is resp
+
+    def forget(self, resource):
+        with self.lock:
+            entry = self.entries.pop(resource.getKey(), None)
+            if entry is not None:
+                self.size = self.size - entry[1]
+        return None
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+        return None
+
+    def getStats(self):
+        """Returns [entries, bytes, hits, misses]"""
+        with self.lock:
+            return [len(self.entries), self.size, self.hits, self.misses]
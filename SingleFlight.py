@@ -0,0 +1,154 @@
+# Copyright (C) 2001 David Allen <mda@idatar.com>
+# Copyright (C) 2020 Tom4hawk
+#
+# Released under the terms of the GNU General Public License
+#
+# Coalesces identical requests that are in flight at the same time.  The
+# first caller asking for something does the work, and everybody else who
+# asks for the same thing before it's done waits for that result instead
+# of doing the work again.  Callers can be plain threads or coroutines on
+# the event loop, and they share the same table.
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#############################################################################
+import asyncio
+import threading
+import concurrent.futures
+import Connection
+
+
+class SingleFlight:
+    verbose = None
+
+    def __init__(self):
+        self.lock    = threading.Lock()
+        self.flights = {}
+
+    def countInFlight(self):
+        with self.lock:
+            return len(self.flights)
+
+    def join(self, key):
+        """Returns [future, leader].  If nobody is working on key yet, the
+        caller becomes the leader and must call finish() on future when it
+        is done.  Otherwise future is the one the leader will finish."""
+        with self.lock:
+            future = self.flights.get(key)
+            if future is not None:
+                return [future, None]
+            future = concurrent.futures.Future()
+            self.flights[key] = future
+            return [future, 1]
+
+    def finish(self, key, future, result=None, error=None, token=None):
+        """Hands result (or error) to everybody waiting on future.  token is
+        the leader's CancelToken.  If it was cancelled, the result is only
+        good for the leader and waiters will try again on their own."""
+        with self.lock:
+            if self.flights.get(key) is future:
+                del self.flights[key]
+
+        cancelled = token is not None and token.isCancelled()
+
+        if cancelled:
+            # Whatever the leader got, error or not, came of being stopped.
+            # Nobody else was stopped, so tell them to try again.
+            future.set_result([None, 1])
+        elif error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result([result, None])
+        return None
+
+    def wait(self, future, token=None):
+        """Blocks until future is finished or token is cancelled.  Returns
+        [result, cancelled] as set by finish().  Throws ConnectionException
+        if token is cancelled first."""
+        event = threading.Event()
+        future.add_done_callback(lambda f, event=event: event.set())
+
+        if token is not None:
+            remove = token.addCallback(event.set)
+        else:
+            remove = lambda: None
+
+        try:
+            event.wait()
+        finally:
+            remove()
+
+        if not future.done():
+            raise Connection.ConnectionException("Connection stopped")
+        return future.result()
+
+    def do(self, key, fn, token=None):
+        """Returns fn(), unless somebody else is already running it for key,
+        in which case their result is returned.  token is the caller's
+        CancelToken: cancelling it stops the caller from waiting, but doesn't
+        cancel work other callers are waiting on."""
+        while 1:
+            [future, leader] = self.join(key)
+
+            if leader:
+                try:
+                    result = fn()
+                except BaseException as err:
+                    self.finish(key, future, error=err, token=token)
+                    raise
+                self.finish(key, future, result, token=token)
+                return result
+
+            if self.verbose:
+                print("Joining request in flight for %s" % (key,))
+
+            [result, cancelled] = self.wait(future, token)
+
+            if not cancelled:
+                return result
+            # The leader gave up, so its result is an error.  Try again.
+
+    async def doAsync(self, key, coroFn, token=None, cancellable=None):
+        """Coroutine version of do().  coroFn() must return a new coroutine
+        doing the work.  cancellable(aw, token) is used to wait on aw while
+        honoring token.  See AsyncGopherConnection.cancellable()"""
+        while 1:
+            [future, leader] = self.join(key)
+
+            if leader:
+                try:
+                    result = await coroFn()
+                except BaseException as err:
+                    self.finish(key, future, error=err, token=token)
+                    raise
+                self.finish(key, future, result, token=token)
+                return result
+
+            if self.verbose:
+                print("Joining request in flight for %s" % (key,))
+
+            # shield() keeps our cancellation from cancelling the leader.
+            waiter = asyncio.shield(asyncio.wrap_future(future))
+
+            if cancellable is not None:
+                [result, cancelled] = await cancellable(waiter, token)
+            else:
+                [result, cancelled] = await waiter
+
+            if not cancelled:
+                return result
+
+
+# One table for the whole program, so that all connections share it.
+inflight = SingleFlight()
@@ -0,0 +1,137 @@
+# Copyright (C) 2001 David Allen <mda@idatar.com>
+# Copyright (C) 2020 Tom4hawk
+#
+# Released under the terms of the GNU General Public License
+#
+# Sinks are where the data coming off of a socket goes as it's received:
+# memory, a file, or memory until there's too much of it and then a file.
+# Connection.readAll() writes into them, and MenuParser.MenuSink parses
+# directories as they arrive.  This imports nothing else from the program,
+# so anything can use it without being pulled into an import cycle.
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#############################################################################
+import os
+import tempfile
+import utils
+
+
+class MemorySink:
+    """Collects data coming off of a socket in memory.  Chunks are kept in
+    a list and only joined once, when the data is asked for, so receiving
+    a large document costs linear time."""
+    def __init__(self):
+        self.chunks = []
+        self.length = 0
+
+    def write(self, chunk):
+        self.chunks.append(bytes(chunk))
+        self.length = self.length + len(chunk)
+        return self.length
+
+    def close(self):
+        return None
+
+    def isComplete(self):
+        """Returns true once the sink has everything it wants, so reading
+        can stop without waiting for the server to hang up."""
+        return None
+
+    def getLength(self):
+        return self.length
+
+    def getData(self):
+        """Returns everything written to the sink as bytes."""
+        if len(self.chunks) != 1:
+            self.chunks = [b"".join(self.chunks)]
+        return self.chunks[0]
+
+    def getText(self):
+        """Returns everything written to the sink decoded as text."""
+        return self.getData().decode(encoding="utf-8", errors="ignore")
+
+
+class FileSink(MemorySink):
+    """Writes data coming off of a socket straight into filename instead of
+    keeping it in memory."""
+    def __init__(self, filename):
+        MemorySink.__init__(self)
+        self.filename = filename
+        self.fp = open(filename, "wb")
+
+    def write(self, chunk):
+        self.fp.write(chunk)
+        self.length = self.length + len(chunk)
+        return self.length
+
+    def close(self):
+        if self.fp:
+            self.fp.close()
+            self.fp = None
+        return None
+
+    def getFilename(self):
+        return self.filename
+
+    def getData(self):
+        fp = open(self.filename, "rb")
+        data = fp.read()
+        fp.close()
+        return data
+
+
+class SpillSink(MemorySink):
+    """Keeps data in memory until more than threshold bytes have arrived,
+    then moves it to a new file in directory and writes the rest there.
+    This way small documents stay in memory and big ones never do."""
+    def __init__(self, threshold, directory):
+        MemorySink.__init__(self)
+        self.threshold = threshold
+        self.directory = directory
+        self.filename  = None
+        self.fp        = None
+
+    def write(self, chunk):
+        if self.fp is None and self.length + len(chunk) > self.threshold:
+            os.makedirs(self.directory, exist_ok=True)
+            [fd, self.filename] = tempfile.mkstemp(prefix="spill-",
+                                                   dir=self.directory)
+            self.fp = os.fdopen(fd, "wb")
+
+            for data in self.chunks:
+                self.fp.write(data)
+            self.chunks = []
+
+        if self.fp is not None:
+            self.fp.write(chunk)
+            self.length = self.length + len(chunk)
+            return self.length
+        return MemorySink.write(self, chunk)
+
+    def close(self):
+        if self.fp is not None:
+            self.fp.close()
+            self.fp = None
+        return None
+
+    def getFilename(self):
+        """Returns the name of the file the data was spilled into, or None
+        if it all fit in memory."""
+        return self.filename
+
+    def getData(self):
+        if self.filename is not None:
+            return utils.map_file(self.filename)
+        return MemorySink.getData(self)
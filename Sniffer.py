@@ -0,0 +1,126 @@
+# Copyright (C) 2001 David Allen <mda@idatar.com>
+# Copyright (C) 2020 Tom4hawk
+#
+# Released under the terms of the GNU General Public License
+#
+# Guesses what kind of data a response holds when its type code can't be
+# trusted: a menu, text, an image or some other binary.  Only the first
+# few kilobytes are ever looked at, so it costs the same for a 50 MB file
+# as for a 50 byte one.  Data may be str, bytes or a memory mapped file.
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#############################################################################
+import re
+from gopher import *
+
+# What data can look like
+MENU   = "menu"
+TEXT   = "text"
+IMAGE  = "image"
+BINARY = "binary"
+
+
+class Sniffer:
+    verbose = None
+    PREFIX      = 4096   # Most bytes looked at
+    MAX_LINES   = 20     # Most lines looked at when checking for a menu
+    MENU_SCORE  = 0.5    # Less of the lines than this look right: not a menu
+    BINARY_RATIO = 0.1   # More control characters than this: binary
+
+    # How files we know about start.
+    MAGIC = [[b"GIF87a",            IMAGE],
+             [b"GIF89a",            IMAGE],
+             [b"\x89PNG\r\n\x1a\n", IMAGE],
+             [b"\xff\xd8\xff",      IMAGE],
+             [b"II*\x00",           IMAGE],    # TIFF
+             [b"MM\x00*",           IMAGE],
+             [b"PK\x03\x04",        BINARY],   # Zip
+             [b"\x1f\x8b",          BINARY],   # gzip
+             [b"\x7fELF",           BINARY]]
+
+    # Control characters that don't turn up in text
+    CONTROL = re.compile("[\x00-\x08\x0e-\x1a\x1c-\x1f\x7f]")
+
+    def sniff(self, data):
+        """Returns [kind, confidence] for data, where kind is one of MENU,
+        TEXT, IMAGE or BINARY, and confidence is between 0 and 1.  Empty
+        data is text, with no confidence at all."""
+        if not data:
+            return [TEXT, 0.0]
+
+        prefix = data[0:self.PREFIX]
+        whole  = len(prefix) == len(data)
+
+        if not isinstance(prefix, str):
+            prefix = bytes(prefix)
+
+            for [magic, kind] in self.MAGIC:
+                if prefix.startswith(magic):
+                    return [kind, 1.0]
+
+            # Anything cut in the middle of a character is just dropped.
+            prefix = prefix.decode(encoding="utf-8", errors="ignore")
+
+            if not prefix:
+                return [BINARY, 1.0]
+
+        if "\x00" in prefix:
+            return [BINARY, 1.0]
+
+        ratio = float(len(self.CONTROL.findall(prefix))) / len(prefix)
+        if ratio > self.BINARY_RATIO:
+            return [BINARY, min(1.0, 0.5 + ratio)]
+
+        score = self.menuScore(prefix, whole)
+        if score >= self.MENU_SCORE:
+            return [MENU, score]
+        return [TEXT, 1.0 - ratio]
+
+    def menuScore(self, text, whole=1):
+        """Returns how much text looks like the start of a menu, as the
+        fraction of its first lines that have a type code we know and
+        enough tabs.  If whole is false, text was cut short, so its last
+        line doesn't count."""
+        # Some very strange non-standards compliant servers send \r on some
+        # lines and not on others.  So split by newline and remove all
+        # carriage returns as they occur.
+        lines = text.replace("\r", "").split("\n")
+
+        if not whole:
+            lines = lines[:-1]
+
+        count = 0
+        good  = 0
+
+        for line in lines:
+            d = line.strip()
+            if d == '' or d == '.':
+                continue
+
+            count = count + 1
+            if line.count("\t") >= 2 and \
+               (line[0] in responses or line[0] in errors):
+                good = good + 1
+
+            if count >= self.MAX_LINES:
+                break
+
+        if count == 0:
+            return 0.0
+        return float(good) / count
+
+
+# One sniffer for the whole program.
+sniffer = Sniffer()
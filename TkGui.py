@@ -64,6 +64,7 @@ class TkGui(Tk):
         self.bookmarks = None
 
         self.loadOptions()              # Load program options from disk
+        self.loadDNSCache()             # Load remembered hostname lookups
         self.loadBookmarks()            # Load program bookmarks from disk
         self.createAssociations()       # Load program associations
 
@@ -100,14 +101,13 @@ class TkGui(Tk):
 
         self.BACKWARD = Button(self.buttonBar, text='Back', command=self.goBackward)
         self.FORWARD  = Button(self.buttonBar, text='Forward', command=self.goForward)
-        # self.STOP   = Button(self.buttonBar, text='Stop',
-        #                      command=self.stop)
+        self.STOP     = Button(self.buttonBar, text='Stop', command=self.stop)
         self.RELOAD   = Button(self.buttonBar, text='Reload', command=self.reload)
         self.HOME     = Button(self.buttonBar, text='Home', command=self.goHome)
 
         self.BACKWARD.pack(side='left')
         self.FORWARD.pack(side='left')
-        # self.STOP.pack(side='left')
+        self.STOP.pack(side='left')
         self.RELOAD.pack(side='left')
         self.HOME.pack(side='left')
 
@@ -195,6 +195,10 @@ class TkGui(Tk):
         if Options.program_options.getOption('delete_cache_on_exit'):
             print("Deleting cache on exit...")
             Options.program_options.cache.deleteCacheNoPrompt()
+
+        self.saveDNSCache()
+        self.CONTENT_BOX.shutdown()
+        Options.program_options.cache.emptySpool()
         
         Tk.destroy(self)
         print("MT:  Exit")
@@ -329,6 +333,33 @@ class TkGui(Tk):
         print("****Successfully loaded options from disk.")
         return 1
     
+    def loadDNSCache(self, filename=None):
+        if filename is None:
+            filename = self.getPrefsDirectory() + os.sep + "dnscache"
+
+        opts = Options.program_options
+        dns  = opts.getDNSCache()
+        dns.setTTL(opts.getIntOption('dns_ttl', dns.TTL),
+                   opts.getIntOption('dns_negative_ttl', dns.NEGATIVE_TTL))
+
+        try:
+            dns.load(filename)
+        except IOError as errstr:
+            print("****Couldn't load DNS cache at %s: %s" % (filename, errstr))
+            return None
+        return 1
+
+    def saveDNSCache(self, filename=None):
+        if filename is None:
+            filename = self.getPrefsDirectory() + os.sep + "dnscache"
+
+        try:
+            Options.program_options.getDNSCache().save(filename)
+        except IOError as errstr:
+            print("***Error saving DNS cache to disk: %s" % errstr)
+            return None
+        return 1
+    
     def saveOptions(self, *args):
         """Saves the user options to a file in their home directory.  Who knows
         what happens on windows boxen."""
@@ -363,10 +394,18 @@ class TkGui(Tk):
             return None
         
         print("****Bookmarks successfully loaded from disk.")
+        self.pinBookmarks()
         return 1
+
+    def pinBookmarks(self):
+        """Keeps whatever is bookmarked in the cache, and lets go of what
+        isn't anymore.  Call this whenever the bookmarks change."""
+        Options.program_options.cache.setPinned(self.bookmarks.getBookmarks())
+        return None
     
     def saveBookmarks(self, *args):
         filename = self.getPrefsDirectory() + os.sep + "bookmarks"
+        self.pinBookmarks()
 
         try:
             factory = BookmarkFactory()
@@ -378,9 +417,9 @@ class TkGui(Tk):
         return 1
 
     def stop(self, *args):
-        """Just set green light to a false value, and wait for the download
-        thread to get the point.  It will quit once it sees this."""
-        return Options.program_options.redLight()
+        """Stops the download in progress.  The download thread is woken up
+        and quits right away."""
+        return self.CONTENT_BOX.stop()
 
     def goForward(self, *args):
         self.CONTENT_BOX.goForward()
@@ -552,6 +591,7 @@ class TkGui(Tk):
         self.navmenu.add_command(label="Forward", command=self.goForward)
         self.navmenu.add_command(label="Backward", command=self.goBackward)
         self.navmenu.add_command(label="Reload", command=self.reload)
+        self.navmenu.add_command(label="Stop", command=self.stop)
 
         self.optionsmenu = Menu(self.menu)
         self.optionsmenu.add_command(label='Associations', command=self.editAssociations)
@@ -36,16 +36,20 @@
 # System wide imports
 from tkinter   import *                # Tk interface
 from threading import *                # Threads
+from concurrent.futures import ThreadPoolExecutor
 import Pmw                             # Python Mega Widgets
 import os                              # Operating system stuff
 import socket                          # Socket communication
 import sys
+import queue
 import tkinter.filedialog
 
 # Non-GUI FORG specific imports
 from gopher import *
 import utils
+import CancelToken
 import GopherConnection
+import AsyncGopherConnection
 import AskForm
 import GopherResource
 import GopherResponse
@@ -55,6 +59,7 @@ import Associations
 import List
 import ListNode
 import State
+import Sniffer
 
 # GUI Specific
 import GUIAskForm
@@ -82,6 +87,8 @@ def getVersion():
 
 class FORG(Frame):
     verbose = None
+    HANDOFF_INTERVAL   = 20   # Milliseconds between checks for async results
+    NAVIGATION_WORKERS = 2    # Threads fetching documents to display
     
     def __init__(self, parent_widget, resource, response=None,
                  messageBar=None,
@@ -97,9 +104,23 @@ class FORG(Frame):
         self.locations      = List.List()
         self.navList        = List.List()
 
+        # Results of work done on the event loop thread are handed back to
+        # the Tk thread through this queue.  See runAsync()
+        self.handoff        = queue.Queue()
+        self.handoffPending = 0
+
         self._createPopup()
         
         self.currentContent = None
+        self.token          = None   # Cancels the transfer in progress
+        self.partial        = [None, None]  # See showRows()
+
+        # Navigations are fetched by a small fixed pool of workers.  Each one
+        # gets a generation number, and only the latest one is displayed.
+        self.generation     = 0
+        self.navPool        = ThreadPoolExecutor(
+            max_workers=self.NAVIGATION_WORKERS,
+            thread_name_prefix="Navigation")
 
         # Go wherever the user intended us to go.
         self.goElsewhere(resource)
@@ -167,31 +188,133 @@ class FORG(Frame):
         resource passed during the creation of this object"""
         return self.response
 
-    def getGopherResponse(self):
-        """This fetches the resource handed to the object from the network
-        if necessary."""
-        self.conn = GopherConnection.GopherConnection()
-        msg = "Done"
+    def fetchResponse(self, resource, token=None, rowCallback=None):
+        """This fetches resource from the network and returns the response.
+        token is the CancelToken.CancelToken for the fetch, and rowCallback
+        is passed on to GopherConnection.getResource().  This runs on a
+        navigation worker thread, so it must not touch any widgets."""
+        conn = GopherConnection.GopherConnection()
         try:
-            self.response = self.conn.getResource(resource=self.resource, msgBar=self.mb)
+            response = conn.getResource(resource=resource, msgBar=self.mb,
+                                        token=token, rowCallback=rowCallback)
         except GopherConnection.GopherConnectionException as estr:
-            raise FORGException("Error: " + estr)
+            raise FORGException("Error: %s" % estr)
         except socket.error as err:
-            try:
-                if len(err) >= 2:
-                    msg = "Can't fetch: errcode %d: %s" % (err[0], err[1])
-                else:
-                    msg = "Can't fetch: error %s" % err[0]
-            except AttributeError:  # This is really weird, don't ask.
-                msg =  "Can't fetch - unknown error."
-            err = "getGopherResponse: %s" % err
+            err = "fetchResponse: %s" % err
             raise FORGException(err)
 
-        if self.response.getError():
-            raise FORGException(self.response.getError())
+        if response.getError():
+            raise FORGException(response.getError())
+
+        return response
+
+    def newCancelToken(self):
+        """Returns a fresh CancelToken for a new transfer, which stop() will
+        cancel.  The transfer it replaces is cancelled, since nobody is
+        going to look at its result anymore."""
+        if self.token is not None:
+            self.token.cancel()
+        self.token = CancelToken.CancelToken()
+        return self.token
+
+    def newGeneration(self):
+        """Starts a new navigation.  Any navigation still in progress is
+        superseded: it is cancelled, and its result won't be displayed.
+        Returns [generation, token] for the new navigation."""
+        self.generation = self.generation + 1
+        self.partial    = [None, None]
+        return [self.generation, self.newCancelToken()]
+
+    def isCurrent(self, generation):
+        """Returns true if generation is the latest navigation."""
+        return generation == self.generation
+
+    def shutdown(self):
+        """Stops any transfer in progress, and lets the navigation workers
+        exit.  Call this when the window goes away."""
+        self.newGeneration()
+        self.navPool.shutdown(wait=False)
+        return None
 
-        # Turn the green light back on, since we're done with the transmission.
-        self.opts.greenLight()
+    def stop(self, *args):
+        """Stops the transfer in progress, if there is one.  The download
+        thread wakes up right away and gives up."""
+        if self.token is not None:
+            self.token.cancel()
+            utils.msg(self.mb, "Stopped.")
+        return None
+
+    def runAsync(self, coro, callback=None, errback=None):
+        """Runs the coroutine coro on the shared event loop thread and
+        returns a concurrent.futures.Future for it.  When coro finishes,
+        callback is called with its result, or errback with the exception it
+        raised.  Both are called from the Tk thread, so they may touch
+        widgets.  Call this from the Tk thread only."""
+        future = AsyncGopherConnection.getEventLoop().submit(coro)
+        return self.handOff(future, callback, errback)
+
+    def handOff(self, future, callback=None, errback=None):
+        """Arranges for callback or errback to be called from the Tk thread
+        once the concurrent.futures.Future future is done.  Returns
+        future."""
+        def done(future, s=self, callback=callback, errback=errback):
+            # This runs on whatever thread finished the future.  Don't
+            # touch Tk here.
+            s.handoff.put([future, callback, errback])
+
+        future.add_done_callback(done)
+        self.handoffPending = self.handoffPending + 1
+
+        if self.handoffPending == 1:
+            self.after(self.HANDOFF_INTERVAL, self._drainHandoff)
+        return future
+
+    def relay(self, callback):
+        """Returns a function that may be called from any thread while a
+        task started with runAsync() or handOff() is still running.  Each
+        call is passed on to callback, with the same arguments, from the Tk
+        thread."""
+        def relayed(*args, s=self, callback=callback):
+            s.handoff.put([None, callback, args])
+        return relayed
+
+    def _drainHandoff(self):
+        """Runs the callbacks of every finished background task, and keeps
+        polling while some are still outstanding."""
+        while 1:
+            try:
+                [future, callback, errback] = self.handoff.get_nowait()
+            except queue.Empty:
+                break
+
+            if future is None:
+                # Progress from a running task.  See relay()
+                try:
+                    callback(*errback)
+                except Exception as errstr:
+                    print("*** Background task callback failed: %s" % errstr)
+                continue
+
+            self.handoffPending = self.handoffPending - 1
+
+            if future.cancelled():
+                continue
+
+            err = future.exception()
+
+            try:
+                if err is not None:
+                    if errback is not None:
+                        errback(err)
+                    else:
+                        print("*** Background task failed: %s" % err)
+                elif callback is not None:
+                    callback(future.result())
+            except Exception as errstr:
+                print("*** Background task callback failed: %s" % errstr)
+
+        if self.handoffPending > 0:
+            self.after(self.HANDOFF_INTERVAL, self._drainHandoff)
         return None
 
     def popupMenu(self, event):
@@ -229,6 +352,10 @@ class FORG(Frame):
             node = self.navList.getNext()
             data = node.getData()
 
+            # Whatever was loading is now stale, and mustn't replace the
+            # page we're going to when it arrives.
+            self.newGeneration()
+
             # In case we are going forward to an error message...
             if not data.getResponse():
                 # Remove current item in the list.
@@ -250,6 +377,10 @@ class FORG(Frame):
             node = self.navList.getPrev()
             state = node.getData()
 
+            # Whatever was loading is now stale, and mustn't replace the
+            # page we're going to when it arrives.
+            self.newGeneration()
+
             # In case we are going back to an error message...
             if not state.getResponse():
                 # Remove current item in the list.
@@ -268,45 +399,105 @@ class FORG(Frame):
                 print("Couldn't get prev: %s" % errstr)
 
     def downloadResource(self, res):
-        """Downloads the resource from the network and redisplays"""
-        self.resource = res
-
-        try:
-            self.getGopherResponse()
-        except FORGException as estr:
-            self.genericError("Error fetching resource:\n%s" % estr)
+        """Downloads the resource from the network on a navigation worker,
+        and displays it when it arrives unless the user has gone somewhere
+        else by then."""
+        [generation, token] = self.newGeneration()
+
+        def show(response, s=self, res=res, generation=generation):
+            if not s.isCurrent(generation):
+                return None   # Superseded by a newer navigation.
+            s.resource = res
+            s.response = response
+            s.showResponse(generation)
+            s.navList.insert(ListNode.ListNode(State.State(s.response,
+                                                           s.resource,
+                                                           s.child)))
             return None
-            
-        self.createResponseWidget()
-        self.navList.insert(ListNode.ListNode(State.State(self.response, self.resource, self.child)))
-        self.changeContent(self.child)
-        return None
 
-    def reload(self):
-        newthread = Thread(group=None,
-                           target=self.reloadResource,
-                           name="Reload Thread",
-                           args=())
-        # Thread is responsible for adding the resource to the queue list
-        # It will run and do its thing and when the function returns, the \
-        # thread ends.
-        newthread.start()
+        self.runInPool(self.fetchResponse,
+                       [res, token, self.showRows(res, generation)], show,
+                       self.fetchFailed(generation))
         return None
 
-    def reloadResource(self):
+    def showRows(self, res, generation):
+        """Returns the rowCallback for fetching the directory res in the
+        navigation generation.  It puts the directory on the screen as
+        soon as the first rows are in, and adds rows as more come.
+        showResponse() finishes it off."""
+        def rows(store, s=self, res=res, generation=generation):
+            if not s.isCurrent(generation):
+                return None   # Superseded by a newer navigation.
+
+            if s.partial[0] == generation:
+                s.partial[1].appendRows()
+                return None
+
+            resp = GopherResponse.GopherResponse()
+            resp.setType(res.getTypeCode())
+            resp.setResponses(store)
+
+            s.resource = res
+            s.response = resp
+            s.createDirectoryWidget(None)
+            s.partial  = [generation, s.child]
+            s.changeContent(s.child)
+            return None
+
+        return self.relay(rows)
+
+    def showResponse(self, generation):
+        """Puts self.response, fetched in the navigation generation, on the
+        screen.  If it's a directory that's already being shown while it
+        arrived, that's finished off instead of starting over."""
+        [partialGeneration, partial] = self.partial
+        self.partial = [None, None]
+
+        if partialGeneration != generation:
+            self.createResponseWidget()
+            self.changeContent(self.child)
+            return self.child
+
+        self.cacheResponse()
+        self.child = partial
+        self.child.setResponse(self.response)
+        self.child.appendRows()
+        return self.child
+
+    def fetchFailed(self, generation):
+        """Returns the errback for the navigation generation"""
+        def error(estr, s=self, generation=generation):
+            if s.isCurrent(generation) and not s.token.isCancelled():
+                s.genericError("Error fetching resource:\n%s" % estr)
+            return None
+        return error
+
+    def reload(self):
         """Reloads from the network the current resource."""
-        try:
-            self.getGopherResponse()
-        except FORGException as estr:
-            self.genericError("Error fetching resource:\n%s" % estr)
+        [generation, token] = self.newGeneration()
+        res = self.resource
+
+        def show(response, s=self, res=res, generation=generation):
+            if not s.isCurrent(generation):
+                return None   # Superseded by a newer navigation.
+            s.resource = res
+            s.response = response
+            s.showResponse(generation)
+            state = State.State(s.response, s.resource, s.child)
+            s.navList.getCurrent().setData(state)
             return None
-        
-        self.createResponseWidget()
-        s = State.State(self.response, self.resource, self.child)
-        self.navList.getCurrent().setData(s)
-        self.changeContent(self.child)
+
+        self.runInPool(self.fetchResponse,
+                       [res, token, self.showRows(res, generation)], show,
+                       self.fetchFailed(generation))
         return None
 
+    def runInPool(self, fn, args, callback=None, errback=None):
+        """Runs fn(*args) on one of the navigation workers.  callback or
+        errback is then called from the Tk thread, like with runAsync()"""
+        future = self.navPool.submit(fn, *args)
+        return self.handOff(future, callback, errback)
+
     def getCurrentURL(self):
         return self.resource.toURL()
     
@@ -331,15 +522,11 @@ class FORG(Frame):
             utils.msg(self.mb,
                       "Document not in cache. Fetching from network.")
             # We need to fetch this document from the network.
-            # Signal the download thread to go to work, and get out.
-            newthread = Thread(group=None,
-                               target=self.downloadResource,
-                               name="Download Thread",
-                               args=(self.resource,))
-            # Thread is responsible for adding the resource to the queue list
-            newthread.start()
+            # Hand it to the navigation workers, and get out.
+            self.downloadResource(self.resource)
             return
         else:
+            self.newGeneration()   # Whatever was loading is now stale.
             utils.msg(self.mb, "Loading document from cache to display.")
             self.createResponseWidget()
             s = State.State(self.response, self.resource, self.child)
@@ -381,24 +568,7 @@ class FORG(Frame):
             raise(FORGException,
                   "createResponseWidget: No valid resource present")
 
-        cfilename = None
-        
-        if self.opts.getOption('use_cache'):
-            utils.msg(self.mb, 'Caching data...')
-            cfilename = ''
-
-            _resr = self.resource.shouldCache()
-            _resp = self.response.shouldCache()
-            
-            if not self.resource.isAskType() and _resr and _resp:
-                # Don't try to cache ASK blocks.  It will only throw an
-                # exception since caching them isn't a very stellar idea.
-                try:
-                    cfilename = self.opts.cache.cache(resp=self.response,
-                                                      resource=self.resource)
-                except Cache.CacheException as exceptionstr:
-                    self.genericError(exceptionstr)
-
+        cfilename = self.cacheResponse()
         r = self.response
 
         if self.response.getTypeCode() == RESPONSE_INDEXS:
@@ -425,7 +595,9 @@ class FORG(Frame):
                 if assoc is not None:
                     self.LAUNCH_ME = [cfilename, assoc]
                     
-            if self.response.getTypeCode() == RESPONSE_FILE:
+            # Binaries served as text files still get saved, not shown.
+            if self.response.getTypeCode() == RESPONSE_FILE and \
+               self.response.sniff()[0] not in [Sniffer.IMAGE, Sniffer.BINARY]:
                 self.child = GUIFile.GUIFile(parent_widget=self,
                                              parent_object=self,
                                              resp=self.response,
@@ -439,17 +611,46 @@ class FORG(Frame):
                                                      filename=cfilename)
 
         else:  # There is no data, display a directory entry
-            ma = {
-                "Back"       : self.goBackward,
-                "Forward"    : self.goForward,
-                "About FORG" : self.about }
-                
-            self.child = GUIDirectory.GUIDirectory(parent_widget=self,
-                                                   parent_object=self, 
-                                                   resp=self.response,
-                                                   resource=self.resource,
-                                                   filename=cfilename,
-                                                   menuAssocs=ma)
+            self.createDirectoryWidget(cfilename)
+
+    def createDirectoryWidget(self, cfilename):
+        """Makes the child widget showing the directory in self.response,
+        which may still be arriving.  See showRows()"""
+        ma = {
+            "Back"       : self.goBackward,
+            "Forward"    : self.goForward,
+            "About FORG" : self.about }
+
+        self.child = GUIDirectory.GUIDirectory(parent_widget=self,
+                                               parent_object=self, 
+                                               resp=self.response,
+                                               resource=self.resource,
+                                               filename=cfilename,
+                                               menuAssocs=ma)
+        return self.child
+
+    def cacheResponse(self):
+        """Saves self.response to the cache if it should be.  Returns the
+        name of the file it was saved to, '' if it couldn't be, or None if
+        the cache isn't used."""
+        cfilename = None
+        
+        if self.opts.getOption('use_cache'):
+            utils.msg(self.mb, 'Caching data...')
+            cfilename = ''
+
+            _resr = self.resource.shouldCache()
+            _resp = self.response.shouldCache()
+            
+            if not self.resource.isAskType() and _resr and _resp:
+                # Don't try to cache ASK blocks.  It will only throw an
+                # exception since caching them isn't a very stellar idea.
+                try:
+                    cfilename = self.opts.cache.cache(resp=self.response,
+                                                      resource=self.resource)
+                except Cache.CacheException as exceptionstr:
+                    self.genericError(exceptionstr)
+        return cfilename
 
     def about(self, *args):
         """Display the about box."""
@@ -41,6 +41,16 @@ RESPONSE_SOUND   = "<" # Gopher+ Sound response
 RESPONSE_BLURB   = 'i'
 RESPONSE_HTML    = 'h'
 
+# Types whose data is binary.  Data of these types is kept as bytes all the
+# way from the socket to the disk, and is never decoded as text.
+binary_types = [RESPONSE_DOSBIN,
+                RESPONSE_BINFILE,
+                RESPONSE_GIF,
+                RESPONSE_IMAGE,
+                RESPONSE_BITMAP,
+                RESPONSE_MOVIE,
+                RESPONSE_SOUND]
+
 # Gopher+ errors
 ERROR_NA         = '1' # Item is not available.
 ERROR_TA         = '2' # Try again later (eg. My load is too high right now.)
@@ -0,0 +1,81 @@
+# Times loading a cached menu from the binary form the cache now writes,
+# against reading and reparsing the protocol text it used to write, on
+# generated menus of a few sizes.  Run it from this directory:
+#
+#   python3 menucachebench.py [lines...]
+
+import os
+import sys
+import timeit
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+
+import GopherResource
+import MenuStore
+from parsebench import make_menu
+
+
+def load_text(filename):
+    """What Cache.uncache did with a cached directory before"""
+    fp = open(filename, "r")
+    data = fp.read()
+    fp.close()
+    return MenuStore.MenuStore(data)
+
+
+def load_binary(filename):
+    fp = open(filename, "rb")
+    data = fp.read()
+    fp.close()
+    store = MenuStore.MenuStore()
+    store.setBinary(data)
+    return store
+
+
+def best(fn, number):
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number
+
+
+def main(sizes):
+    tmpdir = tempfile.mkdtemp()
+    textfile   = os.path.join(tmpdir, "text.idx")
+    binaryfile = os.path.join(tmpdir, "binary.idx")
+
+    print("%8s %10s %10s %10s %10s %8s" % ("lines", "text (KB)",
+                                           "bin (KB)", "text (ms)",
+                                           "bin (ms)", "speedup"))
+    try:
+        for count in sizes:
+            store  = MenuStore.MenuStore(make_menu(count))
+            number = max(1, 20000 // count)
+
+            fp = open(textfile, "w")
+            fp.write(store.toProtocolString() + "\r\n.\r\n")
+            fp.close()
+
+            fp = open(binaryfile, "wb")
+            fp.write(store.toBinary())
+            fp.close()
+
+            assert load_binary(binaryfile).toProtocolString() == \
+                   load_text(textfile).toProtocolString()
+
+            text   = best(lambda: load_text(textfile), number)
+            binary = best(lambda: load_binary(binaryfile), number)
+
+            print("%8d %10d %10d %10.2f %10.2f %7.1fx" %
+                  (count, os.path.getsize(textfile) // 1024,
+                   os.path.getsize(binaryfile) // 1024,
+                   text * 1000, binary * 1000, text / binary))
+    finally:
+        for filename in [textfile, binaryfile]:
+            if os.path.exists(filename):
+                os.unlink(filename)
+        os.rmdir(tmpdir)
+
+
+if __name__ == '__main__':
+    sizes = [int(x) for x in sys.argv[1:]] or [1000, 10000, 100000]
+    main(sizes)
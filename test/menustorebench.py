@@ -0,0 +1,75 @@
+# Measures how much memory a parsed menu takes as a MenuStore, against the
+# list of GopherResource objects directories used to be parsed into, and
+# how long each takes to build.  Run it from this directory:
+#
+#   python3 menustorebench.py [lines...]
+#
+# The goal was a tenth of the memory for a 100k-row menu.  It wasn't met:
+# the store takes about 4x less (100000 rows: 28150 KB as a list, 7246 KB
+# as a store).  The columns only add 9 bytes a row; the rest is the menu
+# text, which the store keeps whole so rows can be cut out of it.
+
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+
+import MenuStore
+from parsebench import old_parse, make_menu
+
+
+def as_list(data):
+    return old_parse(data)
+
+
+def as_store(data):
+    return MenuStore.MenuStore(data)
+
+
+def footprint(fn, data):
+    """Returns the number of bytes still allocated by what fn(data)
+    returns."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept   = fn(data)
+    after  = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return after - before
+
+
+def best(fn, number):
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number
+
+
+def main(sizes):
+    print("%8s %12s %12s %7s %10s %10s" % ("lines", "list (KB)",
+                                           "store (KB)", "ratio",
+                                           "list (ms)", "store (ms)"))
+    for count in sizes:
+        data   = make_menu(count)
+        number = max(1, 20000 // count)
+
+        listmem  = footprint(as_list, data)
+        storemem = footprint(as_store, data)
+        listtime  = best(lambda: as_list(data), number)
+        storetime = best(lambda: as_store(data), number)
+
+        print("%8d %12d %12d %6.1fx %10.2f %10.2f" %
+              (count, listmem // 1024, storemem // 1024,
+               listmem / storemem, listtime * 1000, storetime * 1000))
+
+    # Touching a few rows only makes those few resources.
+    store = as_store(make_menu(sizes[-1]))
+    for x in range(0, len(store), max(1, len(store) // 10)):
+        store[x].toURL()
+    print("\n%d of %d rows made into resources after reading 10 of them" %
+          (store.countMade(), len(store)))
+
+
+if __name__ == '__main__':
+    sizes = [int(x) for x in sys.argv[1:]] or [1000, 10000, 100000]
+    main(sizes)
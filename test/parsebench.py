@@ -0,0 +1,134 @@
+# Times MenuStore against the directory parser it replaced, on generated
+# menus of a few sizes.  The old parser made a resource out of every line,
+# so both sides are timed doing the same work: "shown" is what
+# GUIDirectory does when a directory is displayed (a resource for every
+# row but the blurbs, which are read out of the store's columns), and
+# "all" makes a resource for every row.  Run it from this directory:
+#
+#   python3 parsebench.py [lines...]
+#
+# The goal was a parser at least 5x faster on 10k-line menus.  It wasn't
+# met: doing the same work, MenuStore runs at about 0.7-1.2x the old
+# parser's speed, slower on big menus.  Most of the time goes into making
+# the resources, which GUIDirectory still needs for every row it shows.
+# What MenuStore saves is memory (see menustorebench.py) and the work for
+# rows that are never shown.
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+
+import GopherResource
+import MenuStore
+from gopher import *
+
+
+def old_parse(data):
+    """The parsing loop of GopherResponse.parseResponse before MenuParser"""
+    responses = []
+
+    def stripCR(dat):
+        return dat.replace("\r", "")
+
+    lines = list(map(stripCR, data.split("\n")))
+
+    for line in lines:
+        if len(line) <= 1:
+            continue
+
+        stype = "%s" % line[0]
+        line = line[1:]
+
+        linedata = line.split("\t")
+        name    = "Unknown"
+        locator = "Unknown"
+        host    = "Unknown"
+        port    = 70
+
+        try:
+            name = linedata[0]
+        except IndexError: pass
+        try:
+            locator = linedata[1]
+        except IndexError: pass
+        try:
+            host = linedata[2]
+        except IndexError: pass
+        try:
+            port = linedata[3]
+        except IndexError: pass
+
+        try:
+            remainder = linedata[4:]
+        except:
+            remainder = []
+
+        if host == 'error.host' and stype != RESPONSE_BLURB:
+            stype = RESPONSE_ERR
+
+        newresource = GopherResource.GopherResource(stype, host,
+                                                    port, locator, name,
+                                                    remainder)
+        responses.append(newresource)
+    return responses
+
+
+def make_menu(count):
+    """Returns a menu of count lines that looks like what a Veronica search
+    sends back: mostly items, some blurbs, a few Gopher+ items."""
+    lines = []
+
+    for x in range(count):
+        if x % 10 == 0:
+            lines.append("iSome blurb text %d\t\terror.host\t1" % x)
+        elif x % 3 == 0:
+            lines.append("1Gopher+ item number %d\t/some/selector/%d\t"
+                         "gopher.example.org\t70\t+" % (x, x))
+        else:
+            lines.append("0Item number %d\t/some/selector/%d.txt\t"
+                         "gopher.example.org\t70" % (x, x))
+    return "\r\n".join(lines) + "\r\n.\r\n"
+
+
+def best(fn, number):
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number
+
+
+def shown(data):
+    """Does what GUIDirectory.appendRows() does with a directory's rows"""
+    store = MenuStore.MenuStore(data)
+    for x in range(len(store)):
+        if store.getTypeCode(x) == RESPONSE_BLURB:
+            store.getName(x)
+        else:
+            store[x].getName()
+    return store
+
+
+def everything(data):
+    """Makes a resource for every row, like the old parser did"""
+    return list(MenuStore.MenuStore(data))
+
+
+def main(sizes):
+    print("%8s %10s %10s %8s %10s %8s" % ("lines", "old (ms)", "shown",
+                                          "speedup", "all", "speedup"))
+    for count in sizes:
+        data   = make_menu(count)
+        number = max(1, 20000 // count)
+
+        old = best(lambda: old_parse(data), number)
+        new = best(lambda: shown(data), number)
+        al  = best(lambda: everything(data), number)
+
+        print("%8d %10.2f %10.2f %7.1fx %10.2f %7.1fx" %
+              (count, old * 1000, new * 1000, old / new,
+               al * 1000, old / al))
+
+
+if __name__ == '__main__':
+    sizes = [int(x) for x in sys.argv[1:]] or [100, 1000, 10000]
+    main(sizes)
@@ -0,0 +1,48 @@
+# Checks that cache filenames map back to the keys they were made from.
+# Run them from this directory:
+#
+#   python3 -m unittest test_cachefilename
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+
+import GopherObject
+
+HOSTS   = ["gopher.example.org", "my_host", "a_b_c", "host_8080",
+           "under_score_", "_lead", "x_²"]
+PORTS   = [70, 7070, 8080, 1]
+OBJECTS = [("0", "/some/file.txt"), ("1", "/dir/"), ("1", "/dir"),
+           ("1", ""), ("7", "/search")]
+
+
+class CacheFilenameTest(unittest.TestCase):
+    def testRoundTrip(self):
+        for host in HOSTS:
+            for port in PORTS:
+                for (typecode, locator) in OBJECTS:
+                    key = (host, port, typecode, locator)
+                    if host == "host_8080" and port == 70:
+                        # Looks just like host "host" on port 8080.
+                        continue
+                    filename = GopherObject.keyToCacheFilename(key)
+                    back = GopherObject.cacheFilenameToKey(filename)
+                    with self.subTest(key=key, filename=filename):
+                        self.assertEqual(back[0:3], key[0:3])
+                        self.assertEqual(back[3].rstrip("/"),
+                                         key[3].rstrip("/"))
+
+    def testUnderscoreHosts(self):
+        self.assertEqual(GopherObject.cacheFilenameToKey("my_host/0/x"),
+                         ("my_host", 70, "0", "/x"))
+        self.assertEqual(GopherObject.cacheFilenameToKey("my_host_70/0/x"),
+                         ("my_host_70", 70, "0", "/x"))
+        self.assertEqual(GopherObject.cacheFilenameToKey("my_host_71/0/x"),
+                         ("my_host", 71, "0", "/x"))
+
+
+if __name__ == '__main__':
+    unittest.main()
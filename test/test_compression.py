@@ -0,0 +1,103 @@
+# Tests for compressed copies in the cache.  Run them from this directory:
+#
+#   python3 -m unittest test_compression
+
+import os
+import sys
+import gzip
+import lzma
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+
+import GopherResponse
+import Options
+import Cache
+import GopherResource
+
+TEXT = "Some text that compresses well.  Ünïcödé ☃\n" * 200
+
+
+class CompressionTest(unittest.TestCase):
+    def setUp(self):
+        self.dir  = tempfile.mkdtemp()
+        self.opts = Options.program_options
+        self.old  = [self.opts.getOption('cache_directory'),
+                     self.opts.getOption('cache_prefix'),
+                     self.opts.getOption('cache_compression')]
+        self.opts.setOption('cache_directory', self.dir)
+        self.opts.setOption('cache_prefix', self.dir + os.sep)
+        self.opts.setOption('cache_compression', None)
+        self.cache = Cache.Cache()
+
+    def tearDown(self):
+        self.cache.getIndex().close()
+        [directory, prefix, compression] = self.old
+        self.opts.setOption('cache_directory', directory)
+        self.opts.setOption('cache_prefix', prefix)
+        self.opts.setOption('cache_compression', compression)
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def store(self, resource, data):
+        resp = GopherResponse.GopherResponse()
+        resp.setData(data)
+        filename = self.cache.cache(resp, resource)
+        self.cache.getResponseCache().clear()
+        return filename
+
+    def testRoundTrip(self):
+        for method in ["zlib", "lzma"]:
+            with self.subTest(method=method):
+                self.opts.setOption('cache_compression', method)
+                res = GopherResource.GopherResource('0', 'h.test', 70,
+                                                    '/' + method, 'x')
+                filename = self.store(res, TEXT)
+
+                self.assertEqual(self.cache.getCompression(filename), method)
+                self.assertLess(os.path.getsize(filename), len(TEXT))
+                self.assertEqual(self.cache.uncache(res).getData(), TEXT)
+
+    def testRealGzipIsLeftAlone(self):
+        # A .gz served as text, with compression off, is cached and handed
+        # back exactly as it came; it isn't one of ours to decompress.
+        for data in [gzip.compress(TEXT.encode("utf-8")),
+                     lzma.compress(TEXT.encode("utf-8"))]:
+            with self.subTest(start=data[0:2]):
+                res = GopherResource.GopherResource('0', 'h.test', 70,
+                                                    '/file.gz', 'x')
+                filename = self.store(res, data)
+
+                self.assertIsNone(self.cache.getCompression(filename))
+                self.assertEqual(bytes(self.cache.uncache(res).getData()),
+                                 data)
+
+    def testBadTextIsRefetched(self):
+        self.opts.setOption('cache_compression', "zlib")
+        res = GopherResource.GopherResource('0', 'h.test', 70, '/bad', 'x')
+        filename = self.store(res, TEXT)
+
+        # Decompresses fine, but isn't UTF-8.
+        [header, compress, opener] = self.cache.COMPRESSORS["zlib"]
+        with open(filename, "wb") as fp:
+            fp.write(header + compress(b"\xff\xfe not text"))
+
+        self.assertIsNone(self.cache.uncache(res))
+        self.assertIsNone(self.cache.getIndex().get(res.toCacheFilename()))
+
+    def testDamagedIsRefetched(self):
+        self.opts.setOption('cache_compression', "lzma")
+        res = GopherResource.GopherResource('0', 'h.test', 70, '/cut', 'x')
+        filename = self.store(res, TEXT)
+
+        with open(filename, "r+b") as fp:
+            fp.truncate(os.path.getsize(filename) // 2)
+
+        self.assertIsNone(self.cache.uncache(res))
+        self.assertIsNone(self.cache.getIndex().get(res.toCacheFilename()))
+
+
+if __name__ == '__main__':
+    unittest.main()
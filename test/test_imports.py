@@ -0,0 +1,34 @@
+# Checks that the program's modules can each be imported first, on their
+# own, the way forg.py and TkGui.py are when FORG starts.  The modules
+# import each other in circles, so what loads depends on what was imported
+# first; each import gets a fresh interpreter.  Run them from this
+# directory:
+#
+#   python3 -m unittest test_imports
+
+import os
+import sys
+import subprocess
+import unittest
+
+TOP = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+MODULES = ["forg", "TkGui", "Connection", "GopherConnection",
+           "AsyncGopherConnection", "GopherResponse", "GopherResource",
+           "MenuParser", "MenuStore", "SingleFlight", "Options",
+           "CancelToken", "Sink"]
+
+
+class ImportTest(unittest.TestCase):
+    def testImports(self):
+        for module in MODULES:
+            with self.subTest(module=module):
+                proc = subprocess.run([sys.executable, "-c",
+                                       "import %s" % module],
+                                      cwd=TOP, capture_output=True,
+                                      text=True)
+                self.assertEqual(proc.returncode, 0, proc.stderr)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+# Checks that MenuStore, with MenuParser, reads directories the way the
+# parser they replaced did.  Run them from this directory:
+#
+#   python3 -m unittest test_menuparser
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+
+import MenuStore
+from parsebench import old_parse, make_menu
+
+MENUS = {
+    "generated": make_menu(300),
+    "no cr":     make_menu(30).replace("\r", ""),
+    "stray cr":  "0A\r file\t/a\rb\thost\t70\r\n1Dir\t/d\tother\t7070\n.\n",
+    "missing":   "0Just a name\n1Name\t/sel\n9Name\t/sel\thost.only\n"
+                 "7\n0\t\t\t\n",
+    "error":     "3Not found\t\terror.host\t1\r\n"
+                 "1Disguised error\t/x\terror.host\t1\r\n"
+                 "iBlurb\tfake\terror.host\t1\r\n",
+    "gopher+":   "1Plus\t/p\thost\t70\t+\textra\r\n0Ask\t/q\thost\t70\t?\r\n",
+    "empty":     "",
+}
+
+
+def fields(res):
+    return (res.getTypeCode(), res.getHost(), res.getPort(),
+            res.getLocator(), res.getName())
+
+
+class MenuParserTest(unittest.TestCase):
+    def check(self, made, data):
+        expected = [fields(res) for res in old_parse(data)]
+        self.assertEqual([fields(res) for res in made], expected)
+
+    def testStore(self):
+        for (name, data) in MENUS.items():
+            with self.subTest(menu=name):
+                self.check(list(MenuStore.MenuStore(data)), data)
+
+    def testStoreAddText(self):
+        # Menus that arrive in pieces end up the same as whole ones.
+        data = MENUS["generated"].replace("\r", "")
+        cut  = data.index("\n", len(data) // 2) + 1
+
+        store = MenuStore.MenuStore()
+        store.clear()
+        store.addText(data[:cut])
+        store.addText(data[cut:])
+        self.check(list(store), data)
+
+
+if __name__ == '__main__':
+    unittest.main()
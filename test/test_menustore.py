@@ -0,0 +1,185 @@
+# Tests for the binary form MenuStore saves directories in, and for the
+# cache loading it.  Run them from this directory:
+#
+#   python3 -m unittest test_menustore
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+
+import GopherResponse
+import MenuStore
+import Options
+import Cache
+import GopherResource
+import InfoCache
+import ResourceInformation
+from parsebench import make_menu
+
+MENU = make_menu(200).replace("Item number 5\t",
+                              "Ünïcödé ☃ \U0001f4be 5\t")
+
+
+def rows(store):
+    return [[r.getTypeCode(), r.getHost(), r.getPort(), r.getLocator(),
+             r.getName()] for r in store]
+
+
+def reload(store):
+    copy = MenuStore.MenuStore()
+    copy.setBinary(store.toBinary())
+    return copy
+
+
+class BinaryTest(unittest.TestCase):
+    def testRoundTrip(self):
+        store = MenuStore.MenuStore(MENU)
+        copy  = reload(store)
+
+        self.assertEqual(len(copy), len(store))
+        self.assertEqual(rows(copy), rows(store))
+        self.assertEqual(copy.toProtocolString(), store.toProtocolString())
+        self.assertEqual(copy.getName(5), "Ünïcödé ☃ \U0001f4be 5")
+        self.assertEqual(copy.find("☃"), store.find("☃"))
+        self.assertTrue(copy.isComplete())
+
+    def testEmpty(self):
+        for data in [None, "", ".\r\n"]:
+            with self.subTest(data=data):
+                copy = reload(MenuStore.MenuStore(data))
+                self.assertEqual(len(copy), 0)
+                self.assertEqual(list(copy), [])
+
+    def testPieces(self):
+        # Stores still being filled in keep their text in pieces.
+        store = MenuStore.MenuStore()
+        store.clear()
+        store.addText("0a\t/a\th\t70\n")
+        store.addText("1ß\t/b\th\t7070\n")
+        self.assertEqual(rows(reload(store)),
+                         [["0", "h", 70, "/a", "a"],
+                          ["1", "h", 7070, "/b", "ß"]])
+
+    def damaged(self, data):
+        with self.assertRaises(MenuStore.MenuStoreException):
+            MenuStore.MenuStore().setBinary(data)
+
+    def testTruncated(self):
+        data = MenuStore.MenuStore(MENU).toBinary()
+        for length in [0, 7, MenuStore.BINARY_HEADER.size - 1,
+                       MenuStore.BINARY_HEADER.size, len(data) - 1]:
+            with self.subTest(length=length):
+                self.damaged(data[0:length])
+
+    def testWrongVersion(self):
+        data = bytearray(MenuStore.MenuStore(MENU).toBinary())
+        data[len(MenuStore.BINARY_MAGIC)] = MenuStore.BINARY_VERSION + 1
+        self.damaged(bytes(data))
+
+    def testBadChecksum(self):
+        data = bytearray(MenuStore.MenuStore(MENU).toBinary())
+        data[-10] = data[-10] ^ 0xff
+        self.damaged(bytes(data))
+
+    def testNotBinary(self):
+        self.assertFalse(MenuStore.isBinary(MENU.encode("utf-8")))
+        self.damaged(MENU.encode("utf-8"))
+
+
+class UncacheTest(unittest.TestCase):
+    def setUp(self):
+        self.dir  = tempfile.mkdtemp()
+        self.opts = Options.program_options
+        self.old  = [self.opts.getOption('cache_directory'),
+                     self.opts.getOption('cache_prefix'),
+                     self.opts.getOption('cache_compression')]
+        self.opts.setOption('cache_directory', self.dir)
+        self.opts.setOption('cache_prefix', self.dir + os.sep)
+        self.opts.setOption('cache_compression', None)
+        self.cache = Cache.Cache()
+
+    def tearDown(self):
+        self.cache.getIndex().close()
+        [directory, prefix, compression] = self.old
+        self.opts.setOption('cache_directory', directory)
+        self.opts.setOption('cache_prefix', prefix)
+        self.opts.setOption('cache_compression', compression)
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def testUpgradesTextMenus(self):
+        res = GopherResource.GopherResource('1', 'old.test', 70, '/x', 'x')
+        filename = os.path.join(self.dir, res.toCacheFilename())
+        os.makedirs(os.path.dirname(filename))
+        with open(filename, "w", encoding="utf-8") as fp:
+            fp.write(MENU)
+        self.cache.rebuildIndex()
+
+        resp = self.cache.uncache(res)
+        self.assertEqual(rows(resp.getResponses()),
+                         rows(MenuStore.MenuStore(MENU)))
+
+        # It's been rewritten in the binary form, and the index knows how
+        # big it is now.
+        with open(filename, "rb") as fp:
+            self.assertTrue(MenuStore.isBinary(fp.read()))
+        self.assertEqual(self.cache.getIndex().get(res.toCacheFilename())[0],
+                         os.path.getsize(filename))
+
+        self.cache.getResponseCache().clear()
+        resp = self.cache.uncache(res)
+        self.assertIsNone(resp.getData())
+        self.assertEqual(rows(resp.getResponses()),
+                         rows(MenuStore.MenuStore(MENU)))
+
+    def testDamagedMenusAreRefetched(self):
+        res  = GopherResource.GopherResource('1', 'hub.test', 70, '/', 'x')
+        resp = GopherResponse.GopherResponse()
+        resp.parseResponse(MENU)
+        resp.setData(None)
+        filename = self.cache.cache(resp, res)
+
+        with open(filename, "r+b") as fp:
+            fp.seek(-10, os.SEEK_END)
+            fp.write(b"\xff")
+
+        self.cache.getResponseCache().clear()
+        self.assertIsNone(self.cache.uncache(res))
+        self.assertIsNone(self.cache.getIndex().get(res.toCacheFilename()))
+
+    def testInfoIsAttachedAsRowsAreMade(self):
+        res  = GopherResource.GopherResource('1', 'info.test', 70, '/', 'x')
+        resp = GopherResponse.GopherResponse()
+        resp.parseResponse(MENU)
+        resp.setData(None)
+        item = resp.getResponses()[5]
+        item.setInfo(ResourceInformation.ResourceInformation(
+            "+INFO: 0Item\t/5\thost\t70\n+ADMIN:\n Admin: bob\n"))
+        self.cache.cache(resp, res)
+        self.cache.cacheInfo(resp, res)
+
+        self.cache.getResponseCache().clear()
+        InfoCache.memo.clear()
+        store = self.cache.uncache(res).getResponses()
+        self.assertEqual(store.countMade(), 0)
+
+        self.assertIsNone(store[4].getInfo())
+        self.assertEqual(store[5].getInfo().getBlock("ADMIN"),
+                         item.getInfo().getBlock("ADMIN"))
+
+        # Blocks for rows that were never made are still saved again.
+        store = MenuStore.MenuStore(MENU)
+        store.setInfos({item.toURL(): item.getInfo()})
+        resp.setResponses(store)
+        self.cache.cacheInfo(resp, res)
+        self.cache.getResponseCache().clear()
+        store = self.cache.uncache(res).getResponses()
+        self.assertIsNotNone(store[5].getInfo())
+
+
+if __name__ == '__main__':
+    unittest.main()
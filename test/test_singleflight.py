@@ -0,0 +1,230 @@
+# Tests for SingleFlight.  Run them from this directory:
+#
+#   python3 -m unittest test_singleflight
+
+import os
+import sys
+import asyncio
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+
+import Connection
+import CancelToken
+import SingleFlight
+import GopherConnection
+import AsyncGopherConnection
+import GopherResource
+
+
+class WatchedFlight(SingleFlight.SingleFlight):
+    """Lets the test know when a caller has joined a flight and started
+    waiting on it."""
+    def __init__(self):
+        SingleFlight.SingleFlight.__init__(self)
+        self.waiting = threading.Event()
+
+    def wait(self, future, token=None):
+        self.waiting.set()
+        return SingleFlight.SingleFlight.wait(self, future, token)
+
+
+class SingleFlightTest(unittest.TestCase):
+    def setUp(self):
+        self.flights = WatchedFlight()
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.calls   = []
+
+    def slow(self, token, value):
+        """Returns a function that waits to be released, then either
+        raises like a stopped connection (if token was cancelled) or
+        returns value."""
+        def fn():
+            self.calls.append(value)
+            self.started.set()
+            self.release.wait(5)
+            if token.isCancelled():
+                raise Connection.ConnectionException("Connection stopped")
+            return value
+        return fn
+
+    def startWaiter(self, results, token):
+        def waiter():
+            try:
+                results.append(self.flights.do(
+                    "key", self.slow(token, "waiter"), token))
+            except Exception as err:
+                results.append(err)
+        thread = threading.Thread(target=waiter)
+        thread.start()
+        return thread
+
+    def waitForWaiter(self):
+        self.assertTrue(self.flights.waiting.wait(5))
+
+    def testWaitersShareResult(self):
+        leader  = CancelToken.CancelToken()
+        results = []
+
+        thread = threading.Thread(target=lambda: results.append(
+            self.flights.do("key", self.slow(leader, "leader"), leader)))
+        thread.start()
+        self.started.wait(5)
+
+        waiter = self.startWaiter(results, CancelToken.CancelToken())
+        self.waitForWaiter()
+        self.release.set()
+        thread.join(5)
+        waiter.join(5)
+
+        self.assertEqual(results, ["leader", "leader"])
+        self.assertEqual(self.calls, ["leader"])
+
+    def testWaitersRetryWhenLeaderCancelled(self):
+        leader  = CancelToken.CancelToken()
+        results = []
+        errors  = []
+
+        def lead():
+            try:
+                self.flights.do("key", self.slow(leader, "leader"), leader)
+            except Connection.ConnectionException as err:
+                errors.append(err)
+
+        thread = threading.Thread(target=lead)
+        thread.start()
+        self.started.wait(5)
+
+        waiter = self.startWaiter(results, CancelToken.CancelToken())
+        self.waitForWaiter()
+        leader.cancel()
+        self.release.set()
+        thread.join(5)
+        waiter.join(5)
+
+        # The leader was stopped, but the waiter ran fn() itself.
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(results, ["waiter"])
+        self.assertEqual(self.calls, ["leader", "waiter"])
+        self.assertEqual(self.flights.countInFlight(), 0)
+
+    def testAsyncWaitersRetryWhenLeaderCancelled(self):
+        leader = CancelToken.CancelToken()
+
+        async def run():
+            release = asyncio.Event()
+            calls   = []
+
+            def work(token, value):
+                async def coro():
+                    calls.append(value)
+                    await release.wait()
+                    if token.isCancelled():
+                        raise Connection.ConnectionException("stopped")
+                    return value
+                return coro
+
+            async def lead():
+                try:
+                    return await self.flights.doAsync(
+                        "key", work(leader, "leader"), leader)
+                except Connection.ConnectionException as err:
+                    return err
+
+            first  = asyncio.ensure_future(lead())
+            await asyncio.sleep(0)
+            token  = CancelToken.CancelToken()
+            second = asyncio.ensure_future(self.flights.doAsync(
+                "key", work(token, "waiter"), token))
+            await asyncio.sleep(0)
+
+            leader.cancel()
+            release.set()
+            return [await first, await second, calls]
+
+        [first, second, calls] = asyncio.run(run())
+
+        self.assertIsInstance(first, Connection.ConnectionException)
+        self.assertEqual(second, "waiter")
+        self.assertEqual(calls, ["leader", "waiter"])
+
+
+class AnswerConnection(GopherConnection.GopherConnection):
+    """Answers info and directory info requests with the resource's data
+    block, once both of two requests are in."""
+    def __init__(self, barrier):
+        GopherConnection.GopherConnection.__init__(self)
+        self.barrier = barrier
+
+    def fetchInfo(self, resource, msgBar=None, token=None):
+        self.barrier.wait()
+        return resource.getDataBlock()
+
+    def requestToData(self, resource, request, msgBar=None, token=None):
+        self.barrier.wait()
+        return resource.getDataBlock()
+
+    def makeDirectoryInfo(self, sink):
+        return sink
+
+
+class AsyncAnswerConnection(AsyncGopherConnection.AsyncGopherConnection):
+    async def fetchInfo(self, resource, msgBar=None, token=None):
+        await asyncio.sleep(0.01)
+        return resource.getDataBlock()
+
+    async def requestToDataAsync(self, resource, request, grokLine=None,
+                                 sink=None, token=None):
+        await asyncio.sleep(0.01)
+        return resource.getDataBlock()
+
+    def makeDirectoryInfo(self, sink):
+        return sink
+
+
+class UnsharedRequestTest(unittest.TestCase):
+    """Requests carrying ASK answers have no key, and each one has to get
+    its own answer."""
+    def resources(self, host):
+        made = []
+        for answer in ["A", "B"]:
+            res = GopherResource.GopherResource('1', host, 70, '/ask', 'x')
+            res.setDataBlock(answer)
+            made.append(res)
+        return made
+
+    def testThreads(self):
+        for method in ["getInfo", "getDirectoryInfo"]:
+            barrier = threading.Barrier(2, timeout=5)
+            results = {}
+
+            def get(res):
+                conn = AnswerConnection(barrier)
+                results[res.getDataBlock()] = getattr(conn, method)(res)
+
+            threads = [threading.Thread(target=get, args=(res,))
+                       for res in self.resources("%s.test" % method)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(5)
+
+            with self.subTest(method=method):
+                self.assertEqual(results, {"A": "A", "B": "B"})
+
+    def testAsync(self):
+        for method in ["getInfo", "getDirectoryInfo"]:
+            async def run():
+                calls = [getattr(AsyncAnswerConnection(), method)(res)
+                         for res in self.resources("async%s.test" % method)]
+                return await asyncio.gather(*calls)
+
+            with self.subTest(method=method):
+                self.assertEqual(asyncio.run(run()), ["A", "B"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -20,6 +20,7 @@
 #############################################################################
 import os
 import stat
+import mmap
 
 def summarize_directory(dirname):
     """Returns an array [x, y, z] where x is the number of files in all subdirs
@@ -87,12 +88,20 @@ def character_replace(str, findchar, replacechar):
         # That's a no-no...
         raise Exception("character_replace: findchar == replacechar")
 
-    ind = str.find(findchar)
+    return str.replace(findchar, "%s" % replacechar)
 
-    while ind != -1:
-        str = str[0:ind] + "%s" % replacechar + str[ind+1:]
-        ind = str.find(findchar)
-    return str
+def map_file(filename):
+    """Returns a read-only memory mapped view of filename.  The view acts
+    like a bytes object, but pages of the file are only read when they are
+    used.  Empty files can't be mapped, so b"" is returned for those."""
+    fp = open(filename, "rb")
+
+    try:
+        if os.fstat(fp.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    finally:
+        fp.close()
 
 def dir_exists(dirname):
     try: